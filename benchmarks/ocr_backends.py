@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Compare OCR backends (PyTorch FP32 / INT8 vs ONNX Runtime FP32 / INT8) on dataset/.
+
+`torch-int8` is what the pipeline runs by default: EasyOCR dynamically quantizes the
+CRNN recognizer on CPU. `torch-fp32` builds the reader with quantize=False and is the
+baseline for the deltas.
+
+Reports per-image latency and the accuracy delta against the FP32 PyTorch baseline:
+- text similarity (character-level, difflib ratio) to the torch-fp32 OCR text,
+- rule-based classification accuracy (no LLM, so only OCR differs).
+
+Usage:
+  python benchmarks/ocr_backends.py --dataset dataset --limit 20
+  python benchmarks/ocr_backends.py --limit 40 --onnx-threads 4 --csv results/metrics/ocr_backends.csv
+"""
+import argparse
+import difflib
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.ocr import ocr_image, _get_reader, _parse_langs
+from src.classifier import _rule_based
+from src.eval import LABELS, _true_label_from_path
+from src.utils import list_images
+
+VARIANTS = [
+    ("torch-fp32", dict(backend="torch", quantize=False, fp32=True)),
+    ("torch-int8", dict(backend="torch", quantize=False)),
+    ("onnx-fp32", dict(backend="onnx", quantize=False)),
+    ("onnx-int8", dict(backend="onnx", quantize=True)),
+]
+
+
+def _pick_images(dataset_dir: str, limit: int):
+    per_label = {lab: list_images(os.path.join(dataset_dir, lab)) for lab in LABELS
+                 if os.path.isdir(os.path.join(dataset_dir, lab))}
+    if not per_label:
+        return list_images(dataset_dir)[:limit or None]
+    images = []
+    take = (limit // len(per_label)) if limit else 0
+    for imgs in per_label.values():
+        images.extend(imgs[:take] if take else imgs)
+    return images
+
+
+def _percentile(values, q):
+    vals = sorted(values)
+    if not vals:
+        return 0.0
+    idx = min(len(vals) - 1, int(round(q * (len(vals) - 1))))
+    return vals[idx]
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--dataset", default="dataset")
+    p.add_argument("--limit", type=int, default=20, help="Images to use, split across labels (0 = all).")
+    p.add_argument("--lang", default="en")
+    p.add_argument("--onnx-threads", type=int, default=0)
+    p.add_argument("--csv", default=None, help="Optional path for per-image results CSV.")
+    args = p.parse_args()
+
+    images = _pick_images(args.dataset, args.limit)
+    print(f"Images: {len(images)}")
+
+    baseline_text = {}
+    per_image_rows = []
+    summary = []
+
+    for name, kw in VARIANTS:
+        threads = args.onnx_threads if kw["backend"] == "onnx" else 0
+        try:
+            # warm-up: model load / ONNX export is not part of per-image latency
+            t0 = time.time()
+            _get_reader(_parse_langs(args.lang), threads=threads, **kw)
+            load_time = time.time() - t0
+        except RuntimeError as e:
+            print(f"[{name}] skipped: {e}")
+            continue
+
+        latencies, sims, correct = [], [], 0
+        for path in images:
+            t0 = time.time()
+            res = ocr_image(path, lang=args.lang, threads=threads, **kw)
+            dt = time.time() - t0
+            latencies.append(dt)
+
+            text = res["text"]
+            if name == "torch-fp32":
+                baseline_text[path] = text
+            ref = baseline_text.get(path)
+            sim = difflib.SequenceMatcher(None, ref, text).ratio() if ref is not None else None
+            if sim is not None:
+                sims.append(sim)
+
+            pred, _ = _rule_based(text)
+            true = _true_label_from_path(path)
+            correct += int(pred == true)
+            per_image_rows.append({
+                "backend": name, "image": path, "latency_s": round(dt, 4),
+                "boxes": len(res["boxes"]), "text_similarity": sim,
+                "true_label": true, "pred_label": pred,
+            })
+
+        summary.append({
+            "backend": name,
+            "load_s": load_time,
+            "mean_s": statistics.mean(latencies) if latencies else 0.0,
+            "p50_s": _percentile(latencies, 0.5),
+            "p95_s": _percentile(latencies, 0.95),
+            "text_sim": statistics.mean(sims) if sims else float("nan"),
+            "rules_acc": correct / len(images) if images else 0.0,
+        })
+
+    print(f"\n{'backend':<10} {'load':>7} {'mean':>7} {'p50':>7} {'p95':>7} {'text_sim':>9} {'rules_acc':>9} {'Δacc':>7}")
+    base_acc = summary[0]["rules_acc"] if summary else 0.0
+    for s in summary:
+        print(f"{s['backend']:<10} {s['load_s']:>6.1f}s {s['mean_s']:>6.2f}s {s['p50_s']:>6.2f}s "
+              f"{s['p95_s']:>6.2f}s {s['text_sim']:>9.3f} {s['rules_acc']:>9.3f} {s['rules_acc'] - base_acc:>+7.3f}")
+
+    if args.csv:
+        import pandas as pd
+
+        os.makedirs(os.path.dirname(args.csv) or ".", exist_ok=True)
+        pd.DataFrame(per_image_rows).to_csv(args.csv, index=False)
+        print(f"\nSaved: {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""OCR throughput scaling curve for workers x threads-per-worker splits.
+
+Each configuration runs in a fresh interpreter so the BLAS/OpenMP env vars
+are applied before torch/cv2 are imported (exactly like main.py does).
+The "oversubscribed" rows reproduce the old behaviour: every worker uses all cores.
+
+Usage:
+  python benchmarks/thread_scaling.py --dataset dataset --images 16
+  python benchmarks/thread_scaling.py --workers 1 2 4 8 --pin
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from src.resources import plan_threads, configure_process, init_worker, available_cores
+
+
+def _ocr_only(path: str, lang: str, threads: int) -> int:
+    from src.ocr import ocr_image
+
+    return len(ocr_image(path, lang=lang, threads=threads)["boxes"])
+
+
+def _child(args):
+    """Run one configuration and print a JSON line with the timing."""
+    plan = plan_threads(workers=args.child_workers, threads_per_worker=args.child_threads)
+    configure_process(plan)
+
+    from src.utils import list_images
+
+    images = list_images(args.dataset)[: args.images]
+    if plan["workers"] == 1:
+        _ocr_only(images[0], args.lang, plan["threads_per_worker"])  # warm-up (model load)
+        t0 = time.time()
+        for p in images:
+            _ocr_only(p, args.lang, plan["threads_per_worker"])
+    else:
+        import multiprocessing as mp
+        from concurrent.futures import ProcessPoolExecutor
+
+        counter = mp.Value("i", 0)
+        with ProcessPoolExecutor(plan["workers"], initializer=init_worker,
+                                 initargs=(plan, counter, args.pin)) as pool:
+            # warm-up: one image per worker so model loading is not counted
+            list(pool.map(_ocr_only, images[: plan["workers"]], [args.lang] * plan["workers"],
+                          [plan["threads_per_worker"]] * plan["workers"]))
+            t0 = time.time()
+            list(pool.map(_ocr_only, images, [args.lang] * len(images),
+                          [plan["threads_per_worker"]] * len(images)))
+    elapsed = time.time() - t0
+    print(json.dumps({
+        "workers": plan["workers"],
+        "threads_per_worker": plan["threads_per_worker"],
+        "images": len(images),
+        "elapsed_s": elapsed,
+    }))
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--dataset", default="dataset")
+    p.add_argument("--images", type=int, default=16)
+    p.add_argument("--lang", default="en")
+    p.add_argument("--workers", type=int, nargs="+", default=None,
+                   help="Worker counts to try (default: powers of two up to the core count).")
+    p.add_argument("--pin", action="store_true", help="Pin workers to cores.")
+    p.add_argument("--child-workers", type=int, default=0, help=argparse.SUPPRESS)
+    p.add_argument("--child-threads", type=int, default=0, help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.child_workers:
+        _child(args)
+        return
+
+    n_cores = len(available_cores())
+    worker_counts = args.workers or [w for w in (1, 2, 4, 8, 16, 32) if w <= n_cores]
+
+    configs = []
+    for w in worker_counts:
+        configs.append((w, max(1, n_cores // w)))  # budgeted split
+        if w > 1:
+            configs.append((w, n_cores))  # oversubscribed (old behaviour)
+
+    print(f"Cores: {n_cores}, images: {args.images}\n")
+    print(f"{'workers':>7} {'threads':>7} {'total':>6} {'time':>8} {'img/s':>7} {'speedup':>8}")
+    base = None
+    for w, t in configs:
+        cmd = [sys.executable, os.path.abspath(__file__), "--dataset", args.dataset,
+               "--images", str(args.images), "--lang", args.lang,
+               "--child-workers", str(w), "--child-threads", str(t)]
+        if args.pin:
+            cmd.append("--pin")
+        out = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT)
+        if out.returncode != 0:
+            print(f"{w:>7} {t:>7}  failed: {out.stderr.strip().splitlines()[-1:]}")
+            continue
+        res = json.loads(out.stdout.strip().splitlines()[-1])
+        rate = res["images"] / res["elapsed_s"] if res["elapsed_s"] else 0.0
+        base = base or rate
+        print(f"{w:>7} {t:>7} {w * t:>6} {res['elapsed_s']:>7.1f}s {rate:>7.3f} {rate / base:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Per-worker memory with and without shared OCR weights.
+
+"before": every worker builds its own easyocr.Reader (old behaviour).
+"after":  the parent preloads the reader and forks workers that share the
+          weights copy-on-write (main.py --share-weights).
+
+RSS counts shared pages in every process, so compare PSS/USS: USS is what
+each extra worker really costs.
+
+Usage:
+  python benchmarks/worker_memory.py --workers 4 --images 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from src.resources import plan_threads, configure_process, init_worker, memory_usage
+
+
+def _ocr_task(path: str, lang: str, threads: int):
+    from src.ocr import ocr_image
+
+    ocr_image(path, lang=lang, threads=threads)
+    return memory_usage()
+
+
+def _child(args):
+    import multiprocessing as mp
+    from concurrent.futures import ProcessPoolExecutor
+
+    plan = plan_threads(workers=args.workers)
+    configure_process(plan)
+    tpw = plan["threads_per_worker"]
+
+    from src.ocr import preload_reader
+    from src.utils import list_images
+
+    ctx = mp.get_context("fork")
+    if args.child_mode == "after":
+        preload_reader(args.lang, threads=tpw)
+    parent = memory_usage()
+
+    images = list_images(args.dataset)[: args.images]
+    peak = {}
+    with ProcessPoolExecutor(args.workers, mp_context=ctx, initializer=init_worker,
+                             initargs=(plan, ctx.Value("i", 0), False)) as pool:
+        for mem in pool.map(_ocr_task, images, [args.lang] * len(images), [tpw] * len(images)):
+            if mem["pid"] not in peak or mem["rss"] > peak[mem["pid"]]["rss"]:
+                peak[mem["pid"]] = mem
+    print(json.dumps({"parent": parent, "workers": list(peak.values())}))
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--dataset", default="dataset")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--images", type=int, default=8)
+    p.add_argument("--lang", default="en")
+    p.add_argument("--child-mode", choices=["before", "after"], default=None, help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.child_mode:
+        _child(args)
+        return
+
+    print(f"Workers: {args.workers}, images: {args.images}\n")
+    print(f"{'mode':<7} {'parent rss':>10} {'worker rss':>10} {'worker pss':>10} {'worker uss':>10} {'sum pss':>8}")
+    for mode in ("before", "after"):
+        cmd = [sys.executable, os.path.abspath(__file__), "--dataset", args.dataset,
+               "--workers", str(args.workers), "--images", str(args.images),
+               "--lang", args.lang, "--child-mode", mode]
+        out = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT)
+        if out.returncode != 0:
+            print(f"{mode:<7} failed: {out.stderr.strip().splitlines()[-1:]}")
+            continue
+        res = json.loads(out.stdout.strip().splitlines()[-1])
+        ws = res["workers"] or [{"rss": 0.0, "pss": 0.0, "uss": 0.0}]
+        avg = {k: sum(w[k] for w in ws) / len(ws) for k in ("rss", "pss", "uss")}
+        total_pss = res["parent"]["pss"] + sum(w["pss"] for w in ws)
+        print(f"{mode:<7} {res['parent']['rss']:>9.0f}M {avg['rss']:>9.0f}M {avg['pss']:>9.0f}M "
+              f"{avg['uss']:>9.0f}M {total_pss:>7.0f}M")
+
+
+if __name__ == "__main__":
+    main()
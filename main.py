@@ -4,20 +4,29 @@
 Usage:
   python main.py path/to/image.jpg
   python main.py --batch dataset --limit 50
+  python main.py --batch dataset --shard 0/4      # one shard (e.g. per machine)
+  python main.py --merge 4                        # combine finished shards in --outdir
+  python main.py --batch dataset --local-shards 4 # N local processes + merge
 """
 import argparse
 import os
+import subprocess
 import sys
 
 # Allow importing modules from src/
 sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
 
-from src.pipeline import process_image
-from src.eval import run_batch
+# NOTE: src.pipeline / src.eval import numpy, torch and cv2, so they are imported
+# inside main() only after the thread budget env vars are set.
+from src.resources import plan_threads, configure_process
 
 def parse_args():
-    p = argparse.ArgumentParser(description="OCR + Local LLM document parser (email/invoice/news/receipt).")
-    p.add_argument("image", nargs="?", help="Path to input image (.jpg/.png).")
+    # allow_abbrev=False: run_local_shards re-invokes main.py with this argv, so a
+    # prefix like `--local 2` must not silently mean --local-shards (endless recursion)
+    p = argparse.ArgumentParser(
+        description="OCR + Local LLM document parser (email/invoice/news/receipt).", allow_abbrev=False
+    )
+    p.add_argument("image", nargs="?", help="Path to input image (.jpg/.png) or multi-page document (.pdf/.tif).")
     p.add_argument("--batch", type=str, default=None, help="Batch folder (e.g., dataset).")
     p.add_argument("--outdir", type=str, default="results", help="Output directory (default: results).")
     p.add_argument("--model", type=str, default="phi3", help="Ollama model name (default: phi3).")
@@ -25,14 +34,137 @@ def parse_args():
     p.add_argument("--limit", type=int, default=0, help="Limit number of images in batch (0 = no limit).")
     p.add_argument("--lang", type=str, default="en", help="EasyOCR language(s), e.g. en or en+lt (default: en).")
     p.add_argument("--annotate", action="store_true", help="Save annotated image with OCR boxes.")
+    p.add_argument("--ocr-backend", choices=["torch", "onnx"], default="torch",
+                   help="OCR inference backend: torch (PyTorch; EasyOCR's INT8 recognizer on CPU) or onnx (ONNX Runtime FP32) (default: torch).")
+    p.add_argument("--onnx-quantize", action="store_true", help="ONNX backend: INT8 dynamic quantization of the recognizer's LSTM/MatMul layers.")
+    p.add_argument("--onnx-threads", type=int, default=0, help="ONNX Runtime intra-op threads (0 = same as --threads-per-worker).")
+    p.add_argument("--workers", type=int, default=1, help="Parallel worker processes in batch mode (default: 1).")
+    p.add_argument("--threads-per-worker", type=int, default=0,
+                   help="Intra-op threads per worker for torch/OpenCV/BLAS (0 = cores / workers).")
+    p.add_argument("--pin-threads", action="store_true", help="Pin each worker to its own set of cores (Linux).")
+    p.add_argument("--share-weights", action="store_true",
+                   help="Load the OCR model once and fork workers that share it copy-on-write (torch backend).")
+    p.add_argument("--dedup", action="store_true",
+                   help="Reuse results for near-duplicate scans (perceptual hash index in <outdir>/dedup_index.json).")
+    p.add_argument("--dedup-threshold", type=int, default=6,
+                   help="Max Hamming distance (of 64 bits) for a scan to be a duplicate candidate (default: 6). "
+                        "Candidates are only reused if their OCR text matches (see --dedup-similarity).")
+    p.add_argument("--dedup-similarity", type=float, default=0.8,
+                   help="Min word-level similarity between a candidate's quick OCR text and the earlier result "
+                        "to reuse it (default: 0.8); forms sharing a template hash alike.")
+    p.add_argument("--dedup-hash", choices=["phash", "dhash"], default="phash", help="Perceptual hash (default: phash).")
+    p.add_argument("--page-workers", type=int, default=2, help="Pages OCR'd in parallel for PDF/TIFF input (default: 2).")
+    p.add_argument("--classify-pages", type=int, default=1,
+                   help="Classify multi-page documents from the first N pages (default: 1).")
+    p.add_argument("--pdf-dpi", type=int, default=200, help="PDF rasterization DPI (default: 200).")
+    p.add_argument("--save-boxes", action="store_true",
+                   help="Store OCR boxes in the JSON (compact columnar form under `ocr_boxes`).")
+    p.add_argument("--two-pass", action="store_true",
+                   help="Fast OCR at reduced resolution, then re-recognize low-confidence boxes and "
+                        "missing key fields from the full-resolution image.")
+    p.add_argument("--ocr-scale", type=float, default=0.5, help="First-pass OCR scale for --two-pass (default: 0.5).")
+    p.add_argument("--refine-conf", type=float, default=0.5,
+                   help="Boxes below this confidence are re-recognized in the second pass (default: 0.5).")
+    p.add_argument("--llm-batch", type=int, default=1,
+                   help="Batch mode: keep N documents in flight and classify them together in one "
+                        "multi-document LLM prompt (default: 1 = off; requires --workers 1).")
+    p.add_argument("--llm-batch-chars", type=int, default=12000,
+                   help="Max total characters of document text in one batched LLM prompt (default: 12000).")
+    p.add_argument("--llm-keep-alive", type=str, default=None,
+                   help="How long Ollama keeps the model loaded between requests: a duration (30m, 1h) or "
+                        "seconds (300; -1 = forever, 0 = unload right away) (default: $OLLAMA_KEEP_ALIVE or 30m).")
+    p.add_argument("--shard", type=str, default=None,
+                   help="Batch mode: process only shard i of N (0-based, e.g. 0/4); images are assigned by "
+                        "path hash and results go to <outdir>/shard-i-of-N.")
+    p.add_argument("--merge", type=int, default=0, metavar="N",
+                   help="Merge the N finished shards in --outdir into one predictions CSV, summary and confusion matrix.")
+    p.add_argument("--local-shards", type=int, default=0, metavar="N",
+                   help="Batch mode: run N shards as local processes, then merge them.")
     return p.parse_args()
 
+def _strip_option(argv, name):
+    """argv without `name VALUE` / `name=VALUE`."""
+    out, skip = [], False
+    for a in argv:
+        if skip:
+            skip = False
+        elif a == name:
+            skip = True
+        elif not a.startswith(name + "="):
+            out.append(a)
+    return out
+
+def local_shard_argvs(argv, n, cores, workers=1, threads_per_worker=0):
+    """Arguments for each of the N `main.py --shard i/N` processes (cores: number of usable cores)."""
+    argv = _strip_option(argv, "--local-shards")
+    if not threads_per_worker:
+        # shards share the machine: split the cores between them
+        argv += ["--threads-per-worker", str(max(1, cores // (n * max(1, workers))))]
+    return [[*argv, "--shard", f"{i}/{n}"] for i in range(n)]
+
+def run_local_shards(args, plan):
+    """Start N `main.py --shard i/N` processes (logs in <outdir>/shard-i-of-N/log.txt), wait, merge."""
+    from src.shard import shard_outdir
+
+    n = args.local_shards
+    argvs = local_shard_argvs(sys.argv[1:], n, len(plan["cores"]), args.workers, args.threads_per_worker)
+
+    procs = []
+    for i, argv in enumerate(argvs):
+        logdir = shard_outdir(args.outdir, i, n)
+        os.makedirs(logdir, exist_ok=True)
+        log = open(os.path.join(logdir, "log.txt"), "w", encoding="utf-8")
+        cmd = [sys.executable, os.path.abspath(__file__), *argv]
+        procs.append((i, subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT), log))
+    print(f"🧩 Started {n} shard processes (logs: {args.outdir}/shard-*-of-{n}/log.txt)")
+
+    failed = []
+    for i, proc, log in procs:
+        if proc.wait() != 0:
+            failed.append(i)
+        log.close()
+    if failed:
+        raise SystemExit(f"Shard(s) failed: {', '.join(map(str, failed))} (see their log.txt)")
+
 def main():
     args = parse_args()
 
+    plan = plan_threads(workers=args.workers if args.batch else 1, threads_per_worker=args.threads_per_worker)
+    # The main process only coordinates when there is a worker pool; otherwise it runs OCR itself.
+    configure_process(plan, pin=args.pin_threads and plan["workers"] == 1)
+    if args.llm_keep_alive:
+        from src.llm import parse_keep_alive
+
+        try:
+            parse_keep_alive(args.llm_keep_alive)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        # read on every request; worker processes inherit the environment
+        os.environ["OLLAMA_KEEP_ALIVE"] = args.llm_keep_alive
+
+    from src.pipeline import process_image
+    from src.eval import run_batch, merge_shards
+    from src.shard import parse_shard
+
+    if args.merge:
+        try:
+            merge_shards(args.outdir, args.merge)
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        return
+
     if args.batch:
         if not os.path.isdir(args.batch):
             raise SystemExit(f"Batch folder not found: {args.batch}")
+        # with --shard we are one of the shard processes already
+        if args.local_shards and not args.shard:
+            run_local_shards(args, plan)
+            merge_shards(args.outdir, args.local_shards)
+            return
+        try:
+            shard = parse_shard(args.shard) if args.shard else None
+        except ValueError as e:
+            raise SystemExit(str(e))
         run_batch(
             dataset_dir=args.batch,
             outdir=args.outdir,
@@ -41,6 +173,26 @@ def main():
             limit=args.limit,
             ocr_lang=args.lang,
             annotate=args.annotate,
+            ocr_backend=args.ocr_backend,
+            onnx_quantize=args.onnx_quantize,
+            ocr_threads=args.onnx_threads,
+            thread_plan=plan,
+            pin_threads=args.pin_threads,
+            share_weights=args.share_weights,
+            dedup=args.dedup,
+            dedup_threshold=args.dedup_threshold,
+            dedup_method=args.dedup_hash,
+            dedup_min_similarity=args.dedup_similarity,
+            page_workers=args.page_workers,
+            classify_pages=args.classify_pages,
+            pdf_dpi=args.pdf_dpi,
+            save_boxes=args.save_boxes,
+            two_pass=args.two_pass,
+            ocr_scale=args.ocr_scale,
+            refine_conf=args.refine_conf,
+            llm_batch=args.llm_batch,
+            llm_batch_chars=args.llm_batch_chars,
+            shard=shard,
         )
         return
 
@@ -53,6 +205,14 @@ def main():
     print(f"\n🚀 Processing: {os.path.basename(args.image)}")
     print(f"📂 Output directory: {args.outdir}\n")
 
+    dedup_index = None
+    if args.dedup:
+        from src.dedup import DedupIndex
+
+        dedup_index = DedupIndex(method=args.dedup_hash, threshold=args.dedup_threshold,
+                                 path=os.path.join(args.outdir, "dedup_index.json"),
+                                 min_similarity=args.dedup_similarity)
+
     result = process_image(
         image_path=args.image,
         outdir=args.outdir,
@@ -60,7 +220,24 @@ def main():
         use_llm=not args.no_llm,
         ocr_lang=args.lang,
         annotate=args.annotate,
+        ocr_backend=args.ocr_backend,
+        onnx_quantize=args.onnx_quantize,
+        ocr_threads=args.onnx_threads or plan["threads_per_worker"],
+        dedup_index=dedup_index,
+        page_workers=args.page_workers,
+        classify_pages=args.classify_pages,
+        pdf_dpi=args.pdf_dpi,
+        save_boxes=args.save_boxes,
+        two_pass=args.two_pass,
+        ocr_scale=args.ocr_scale,
+        refine_conf=args.refine_conf,
     )
+    if dedup_index is not None:
+        dedup_index.save()
+    if args.annotate:
+        from src.utils import wait_annotations
+
+        wait_annotations()
 
     print("\n=== RESULT ===")
     print(f"Document type: {result.get('document_type')}")
@@ -0,0 +1,266 @@
+"""asyncio API for embedding the pipeline in services.
+
+OCR (CPU-bound) runs in an executor, LLM calls go through aiohttp, and every
+stage has its own concurrency limit, so one event loop can keep thousands of
+documents in flight without blocking.
+
+Example:
+    async for path, result in aprocess_many(paths, limits=StageLimits(ocr=2, llm=4)):
+        ...
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+import weakref
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Tuple, Union
+
+from .classifier import classify_document_async
+from .extractor import extract_fields_async
+from .pages import DEFAULT_PDF_DPI
+from .pipeline import (
+    _field_targets, _finalize_result, _finish_second_pass, _refine_low_conf,
+    classification_text, extraction_text, run_ocr, save_outputs,
+)
+from .ocr import recognize_boxes
+from .refine import DEFAULT_OCR_SCALE, DEFAULT_REFINE_CONF
+from .utils import ensure_dirs, wait_annotations
+from .dedup import DedupIndex, reused_result
+
+
+def _check_text(image_path: str, ocr_args: Dict[str, Any], scale: float, out: Dict[str, Any]) -> str:
+    out["start"] = time.time()
+    out["ocr"] = run_ocr(image_path, scale=scale, **ocr_args)
+    return out["ocr"]["text"]
+
+
+class StageLimits:
+    """
+    Per-stage concurrency limits.
+    - ocr: concurrent OCR jobs (bounded by the executor as well)
+    - llm: concurrent Ollama requests (classification + extraction)
+    - io: concurrent JSON / annotated image writes
+    Semaphores are created lazily, one set per event loop (an asyncio.Semaphore is bound to
+    the loop it is first used on), so the object can be built outside the loop and reused
+    across asyncio.run() calls.
+    """
+
+    def __init__(self, ocr: int = 1, llm: int = 4, io: int = 8):
+        self.ocr_limit = max(1, ocr)
+        self.llm_limit = max(1, llm)
+        self.io_limit = max(1, io)
+        self._sems: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[asyncio.Semaphore, ...]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _semaphores(self):
+        loop = asyncio.get_running_loop()
+        sems = self._sems.get(loop)
+        if sems is None:
+            sems = self._sems[loop] = (
+                asyncio.Semaphore(self.ocr_limit),
+                asyncio.Semaphore(self.llm_limit),
+                asyncio.Semaphore(self.io_limit),
+            )
+        return sems
+
+    @property
+    def ocr(self) -> asyncio.Semaphore:
+        return self._semaphores()[0]
+
+    @property
+    def llm(self) -> asyncio.Semaphore:
+        return self._semaphores()[1]
+
+    @property
+    def io(self) -> asyncio.Semaphore:
+        return self._semaphores()[2]
+
+
+async def process_image_async(
+    image_path: str,
+    outdir: str = "results",
+    model: str = "phi3",
+    use_llm: bool = True,
+    ocr_lang: str = "en",
+    annotate: bool = False,
+    ocr_backend: str = "torch",
+    onnx_quantize: bool = False,
+    ocr_threads: int = 0,
+    limits: Optional[StageLimits] = None,
+    executor: Optional[Executor] = None,
+    session=None,
+    dedup_index: Optional[DedupIndex] = None,
+    page_workers: int = 2,
+    classify_pages: int = 1,
+    pdf_dpi: int = DEFAULT_PDF_DPI,
+    save_boxes: bool = False,
+    two_pass: bool = False,
+    ocr_scale: float = DEFAULT_OCR_SCALE,
+    refine_conf: float = DEFAULT_REFINE_CONF,
+) -> Dict[str, Any]:
+    """
+    Async process_image: OCR (executor) -> classify (LLM) -> extract (LLM) -> save (executor).
+    Output JSON and the returned dict are identical to the synchronous version.
+    `session` is an optional shared aiohttp.ClientSession.
+    `dedup_index`: near-duplicate scans reuse a prior result (see process_image).
+    two_pass / ocr_scale / refine_conf: as in process_image; the re-recognition steps run
+    in the executor under limits.ocr.
+    """
+    limits = limits or StageLimits()
+    loop = asyncio.get_running_loop()
+    start_time = time.time()
+
+    ocr_args = dict(
+        ocr_lang=ocr_lang, ocr_backend=ocr_backend, onnx_quantize=onnx_quantize,
+        ocr_threads=ocr_threads, page_workers=page_workers, pdf_dpi=pdf_dpi,
+    )
+    img_hash = None
+    check: Dict[str, Any] = {}
+    if dedup_index is not None:
+        img_hash = await loop.run_in_executor(None, dedup_index.hash, image_path)
+        hit = None
+        if dedup_index.candidates(img_hash):
+            # hash'o kandidatas patvirtinamas pigiu OCR (žr. process_image)
+            check_scale = ocr_scale if two_pass else 1.0
+            check_text = partial(_check_text, image_path, ocr_args, check_scale, check)
+            async with limits.ocr:
+                hit = await loop.run_in_executor(executor, dedup_index.lookup, img_hash, check_text)
+        if hit is not None:
+            data = reused_result(hit[1], image_path, hit[0], img_hash, hit[2])
+            data["meta"]["processing_time_seconds"] = round(time.time() - start_time, 3)
+            async with limits.io:
+                await loop.run_in_executor(None, partial(save_outputs, data, {}, image_path, outdir, False))
+            return data
+
+    ocr_kwargs = dict(lang=ocr_lang, backend=ocr_backend, quantize=onnx_quantize, threads=ocr_threads, dpi=pdf_dpi)
+    second_pass = None
+    low_idx = []
+    async with limits.ocr:
+        if "ocr" in check:
+            ocr_start = check["start"]
+            ocr = check["ocr"]
+        else:
+            ocr_start = time.time()
+            ocr = await loop.run_in_executor(executor, partial(
+                run_ocr, image_path, scale=ocr_scale if two_pass else 1.0, **ocr_args,
+            ))
+        if two_pass:
+            second_pass, low_idx = await loop.run_in_executor(executor, partial(
+                _refine_low_conf, image_path, ocr, ocr_scale, refine_conf, ocr_kwargs,
+            ))
+        ocr_time = time.time() - ocr_start
+    text = ocr["text"]
+
+    async with limits.llm:
+        classify_start = time.time()
+        doc_type, conf, method = await classify_document_async(classification_text(ocr, classify_pages), model=model, use_llm=use_llm, session=session)
+        classify_time = time.time() - classify_start
+
+    async with limits.llm:
+        extract_start = time.time()
+        extract_input, extract_pages = extraction_text(ocr, doc_type)
+        data = await extract_fields_async(extract_input, doc_type, model=model, use_llm=use_llm, session=session)
+    if second_pass is not None:
+        targets = _field_targets(ocr, data, doc_type, second_pass, low_idx)
+        if targets:
+            async with limits.ocr:
+                changed = await loop.run_in_executor(executor, partial(
+                    recognize_boxes, image_path, ocr, targets, **ocr_kwargs,
+                ))
+            second_pass["changed_boxes"] += changed
+            if changed:
+                async with limits.llm:
+                    extract_input, extract_pages = extraction_text(ocr, doc_type)
+                    data = await extract_fields_async(extract_input, doc_type, model=model, use_llm=use_llm,
+                                                      session=session)
+        text = ocr["text"]
+        _finish_second_pass(second_pass)
+    extract_time = time.time() - extract_start
+
+    total_time = time.time() - start_time
+    data = _finalize_result(
+        data, image_path, text, ocr, doc_type, conf, method,
+        total_time=total_time, ocr_time=ocr_time, classify_time=classify_time, extract_time=extract_time,
+        save_boxes=save_boxes,
+    )
+    if second_pass is not None:
+        data["meta"]["second_pass"] = second_pass
+    if extract_pages is not None:
+        data["meta"]["classification_pages"] = min(classify_pages, len(ocr["pages"]))
+        data["meta"]["extraction_pages"] = [p + 1 for p in extract_pages]
+
+    async with limits.io:
+        # file writes are small but blocking; keep them off the event loop
+        await loop.run_in_executor(None, partial(save_outputs, data, ocr, image_path, outdir, annotate))
+    if dedup_index is not None:
+        dedup_index.add(img_hash, data)
+
+    return data
+
+
+async def aprocess_many(
+    image_paths: Iterable[str],
+    outdir: str = "results",
+    max_in_flight: int = 64,
+    limits: Optional[StageLimits] = None,
+    executor: Optional[Executor] = None,
+    return_exceptions: bool = False,
+    **kwargs,
+) -> AsyncIterator[Tuple[str, Union[Dict[str, Any], BaseException]]]:
+    """
+    Process many images on one event loop; yields (image_path, result) in completion order.
+    - max_in_flight: documents admitted at once (paths are consumed lazily, so the
+      iterable may be a generator over a huge archive)
+    - limits: per-stage concurrency (default StageLimits())
+    - executor: where OCR runs (default: ThreadPoolExecutor sized to limits.ocr_limit;
+      pass a ProcessPoolExecutor for CPU parallelism across cores)
+    - return_exceptions: yield the exception instead of raising it
+    Remaining kwargs go to process_image_async (model, use_llm, ocr_lang, ...).
+    """
+    try:
+        import aiohttp
+    except ImportError as e:
+        raise RuntimeError("Async API requires `aiohttp` (pip install aiohttp).") from e
+
+    ensure_dirs(outdir)
+    limits = limits or StageLimits()
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=limits.ocr_limit, thread_name_prefix="ocr")
+
+    connector = aiohttp.TCPConnector(limit=limits.llm_limit)
+    paths = iter(image_paths)
+    pending: Dict[asyncio.Task, str] = {}
+
+    def admit(session) -> None:
+        while len(pending) < max_in_flight:
+            path = next(paths, None)
+            if path is None:
+                return
+            task = asyncio.ensure_future(process_image_async(
+                path, outdir=outdir, limits=limits, executor=executor, session=session, **kwargs,
+            ))
+            pending[task] = path
+
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            admit(session)
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    path = pending.pop(task)
+                    exc = task.exception()
+                    if exc is not None and not return_exceptions:
+                        raise exc
+                    yield path, exc if exc is not None else task.result()
+                admit(session)
+        # annotated images are written by a background pool; flush before returning
+        await asyncio.get_running_loop().run_in_executor(None, wait_annotations)
+    finally:
+        for task in pending:
+            task.cancel()
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
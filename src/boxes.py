@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence
+import cv2
+import numpy as np
+
+# OCR box'ai laikomi vienu NumPy structured array vietoj dict'ų sąrašo:
+# mažiau Python objektų, vektorinės operacijos (filtravimas pagal conf/page, piešimas).
+BOX_DTYPE = np.dtype([
+    ("x", "<i4"),
+    ("y", "<i4"),
+    ("w", "<i4"),
+    ("h", "<i4"),
+    ("conf", "<f4"),
+    ("page", "<i2"),
+    ("text", object),
+])
+
+
+def empty_boxes() -> np.ndarray:
+    return np.zeros(0, dtype=BOX_DTYPE)
+
+
+def make_boxes(rows: Sequence[tuple]) -> np.ndarray:
+    """rows: (x, y, w, h, conf, page, text) tuples."""
+    if not rows:
+        return empty_boxes()
+    return np.array(list(rows), dtype=BOX_DTYPE)
+
+
+def concat_boxes(parts: Sequence[np.ndarray]) -> np.ndarray:
+    parts = [p for p in parts if len(p)]
+    return np.concatenate(parts) if parts else empty_boxes()
+
+
+def boxes_to_columns(boxes: np.ndarray, conf_decimals: int = 3) -> Dict[str, List[Any]]:
+    """Kompaktiška JSON forma: vienas sąrašas kiekvienam laukui (raktai nekartojami kiekvienam box'ui)."""
+    cols: Dict[str, List[Any]] = {k: boxes[k].tolist() for k in ("x", "y", "w", "h", "page")}
+    cols["conf"] = np.round(boxes["conf"].astype(np.float64), conf_decimals).tolist()
+    cols["text"] = [str(t) for t in boxes["text"]]
+    return cols
+
+
+def draw_boxes(img: np.ndarray, boxes: np.ndarray, color=(0, 255, 0), thickness: int = 2) -> np.ndarray:
+    """Visi stačiakampiai vienu cv2.polylines kvietimu (N x 4 taškų masyvas)."""
+    if not len(boxes):
+        return img
+    x1 = boxes["x"].astype(np.int32)
+    y1 = boxes["y"].astype(np.int32)
+    x2 = x1 + boxes["w"].astype(np.int32)
+    y2 = y1 + boxes["h"].astype(np.int32)
+    pts = np.stack([
+        np.stack([x1, y1], axis=1),
+        np.stack([x2, y1], axis=1),
+        np.stack([x2, y2], axis=1),
+        np.stack([x1, y2], axis=1),
+    ], axis=1)  # (N, 4, 2)
+    cv2.polylines(img, list(pts), isClosed=True, color=color, thickness=thickness)
+    return img
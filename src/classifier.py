@@ -1,7 +1,10 @@
 from __future__ import annotations
 
-from typing import Tuple
-from .llm import ollama_json
+import asyncio
+import threading
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+from .llm import RequestBatcher, ollama_json, ollama_json_async
 
 LABELS = ["email", "invoice", "news", "receipts"]
 
@@ -43,13 +46,8 @@ def _rule_based(text: str) -> Tuple[str, float]:
 
     return "news", 0.35
 
-def classify_document(text: str, model: str = "phi3", use_llm: bool = True) -> Tuple[str, float, str]:
-    """Return (label, confidence, method)."""
-    if not use_llm:
-        label, conf = _rule_based(text)
-        return label, conf, "rules"
-
-    prompt = f"""You are a strict document classifier.
+def _classification_prompt(text: str) -> str:
+    return f"""You are a strict document classifier.
 
 Task:
 1) Classify the document into exactly ONE label from: {LABELS}
@@ -71,7 +69,7 @@ Document text:
 {text}
 """
 
-    obj, raw = ollama_json(prompt, model=model, temperature=0.0)
+def _parse_classification(obj, text: str) -> Tuple[str, float, str]:
     if isinstance(obj, dict):
         dt = str(obj.get("document_type", "")).strip().lower()
         if dt in LABELS:
@@ -85,3 +83,113 @@ Document text:
     # fallback
     label, conf = _rule_based(text)
     return label, conf, "rules_fallback"
+
+def _batch_classification_prompt(texts: List[str]) -> str:
+    docs = "\n\n".join(f"### Document {i}\n{t}" for i, t in enumerate(texts, 1))
+    return f"""You are a strict document classifier.
+
+Task:
+1) Classify EACH of the {len(texts)} documents below into exactly ONE label from: {LABELS}
+2) Classify every document independently.
+3) Return STRICT JSON only, one result per document, with the document number as "id".
+
+IMPORTANT - Key differences:
+- **invoice**: Formal business document with seller/buyer info, invoice number, VAT breakdown, payment terms, "Bill To", "Date of Issue". Usually multi-party (company to company/client).
+- **receipts**: Simple proof of purchase from store/restaurant. Has store name, items purchased, total, payment method (cash/card). Usually says "Receipt" or "Thank you". Single-party transaction.
+- **email**: Has email headers (From:, To:, Subject:, Date:, CC:).
+- **news**: Article or news page with title, author, published date, long text content.
+
+JSON schema:
+{{
+  "results": [
+    {{"id": 1, "document_type": "email|invoice|news|receipts", "confidence": 0.0}}
+  ]
+}}
+
+Documents:
+{docs}
+"""
+
+def _split_batch_classification(obj, n: int) -> List[Optional[Dict[str, Any]]]:
+    """{"results": [{"id": k, ...}]} -> answer per document (None jei trūksta ar netinkama žymė)."""
+    out: List[Optional[Dict[str, Any]]] = [None] * n
+    results = obj.get("results") if isinstance(obj, dict) else None
+    if not isinstance(results, list):
+        return out
+    for r in results:
+        if not isinstance(r, dict):
+            continue
+        try:
+            i = int(r.get("id")) - 1
+        except (TypeError, ValueError):
+            continue
+        dt = str(r.get("document_type", "")).strip().lower()
+        if 0 <= i < n and out[i] is None and dt in LABELS:
+            out[i] = r
+    return out
+
+def _classify_single(text: str, model: str) -> Optional[Dict[str, Any]]:
+    obj, raw = ollama_json(_classification_prompt(text), model=model, temperature=0.0)
+    return obj
+
+# Klasifikavimo užklausimų sujungimas (žr. configure_batching); vienas RequestBatcher kiekvienam modeliui
+_BATCH_CONFIG: Optional[Dict[str, Any]] = None
+_BATCHERS: Dict[str, RequestBatcher] = {}
+_BATCHERS_LOCK = threading.Lock()
+
+def configure_batching(max_batch: int = 8, max_chars: int = 12000, max_wait: float = 0.05):
+    """
+    Lygiagretūs classify_document kvietimai (iš kelių thread'ų) sujungiami į vieną
+    kelių dokumentų prompt'ą. max_batch <= 1 išjungia.
+    """
+    global _BATCH_CONFIG
+    with _BATCHERS_LOCK:
+        old = list(_BATCHERS.values())
+        _BATCHERS.clear()
+        _BATCH_CONFIG = dict(max_batch=max_batch, max_chars=max_chars, max_wait=max_wait) if max_batch > 1 else None
+    # seni dispečeriai kitaip liktų amžinai laukti _cond.wait()
+    for batcher in old:
+        batcher.close()
+
+def _get_batcher(model: str) -> Optional[RequestBatcher]:
+    with _BATCHERS_LOCK:
+        if _BATCH_CONFIG is None:
+            return None
+        batcher = _BATCHERS.get(model)
+        if batcher is None:
+            batcher = RequestBatcher(
+                single=partial(_classify_single, model=model),
+                build_prompt=_batch_classification_prompt,
+                split=_split_batch_classification,
+                model=model,
+                **_BATCH_CONFIG,
+            )
+            _BATCHERS[model] = batcher
+        return batcher
+
+def classify_document(text: str, model: str = "phi3", use_llm: bool = True) -> Tuple[str, float, str]:
+    """Return (label, confidence, method)."""
+    if not use_llm:
+        label, conf = _rule_based(text)
+        return label, conf, "rules"
+
+    batcher = _get_batcher(model)
+    obj = batcher(text) if batcher is not None else _classify_single(text, model)
+    return _parse_classification(obj, text)
+
+async def classify_document_async(text: str, model: str = "phi3", use_llm: bool = True, session=None) -> Tuple[str, float, str]:
+    """
+    Async variant of classify_document (aiohttp); `session` is an optional shared aiohttp.ClientSession.
+    With configure_batching on, the request goes through the same RequestBatcher as the sync calls
+    (its dispatcher thread does the HTTP call; the event loop only awaits the Future).
+    """
+    if not use_llm:
+        label, conf = _rule_based(text)
+        return label, conf, "rules"
+
+    batcher = _get_batcher(model)
+    if batcher is not None:
+        obj = await asyncio.wrap_future(batcher.submit(text))
+        return _parse_classification(obj, text)
+    obj, raw = await ollama_json_async(_classification_prompt(text), model=model, temperature=0.0, session=session)
+    return _parse_classification(obj, text)
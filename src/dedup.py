@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import copy
+import difflib
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+
+from .pages import first_page, is_multipage
+
+# Perceptual hash'ai pakartotinai atsiųstiems skenams (kita JPEG kokybė / rezoliucija).
+# 64 bitų hash'as (Hamming atstumas <= threshold) tik atrenka kandidatus: to paties šablono
+# formos (pvz. skirtingos sąskaitos iš to paties generatoriaus) skiriasi tik tekstu ir
+# hash'uojasi beveik vienodai. Todėl rezultatas pernaudojamas tik tada, kai naujo vaizdo
+# OCR (pirmo praėjimo, kuris atmetus kandidatą naudojamas toliau) sutampa su ankstesnio
+# rezultato ocr_text.
+HASH_METHODS = ("phash", "dhash")
+DEFAULT_THRESHOLD = 6
+# žodžių lygmens panašumas; skirtingos to paties šablono sąskaitos ~0.25-0.4, tas pats dokumentas ~1.0
+DEFAULT_MIN_SIMILARITY = 0.8
+# meta laukai, kurie aprašo pirminį rezultatą ir prasmingi pernaudojant (be laikų)
+_KEPT_META = ("source_image", "classification_confidence", "classification_method", "ocr_engine")
+
+
+def _load_gray(image_path: str) -> np.ndarray:
+    if is_multipage(image_path):
+        # PDF / TIFF: hash'uojamas pirmas puslapis
+        page = first_page(image_path)
+        img = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY) if page is not None else None
+    else:
+        img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError(f"Could not read image: {image_path}")
+    return img
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    out = 0
+    for b in bits.flatten():
+        out = (out << 1) | int(b)
+    return out
+
+
+def dhash(gray: np.ndarray, size: int = 8) -> int:
+    """Difference hash: ar kiekvienas pikselis šviesesnis už kaimyną dešinėje."""
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    return _bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+def phash(gray: np.ndarray, size: int = 8, highfreq_factor: int = 4) -> int:
+    """DCT hash: žemų dažnių koeficientai palyginami su mediana."""
+    n = size * highfreq_factor
+    small = cv2.resize(gray, (n, n), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:size, :size]
+    # DC koeficientas neįtraukiamas į medianą (jis tik bendras šviesumas)
+    med = np.median(low.flatten()[1:])
+    return _bits_to_int(low > med)
+
+
+def image_hash(image_path: str, method: str = "phash") -> int:
+    if method not in HASH_METHODS:
+        raise ValueError(f"Unknown hash method: {method} (expected one of {HASH_METHODS})")
+    gray = _load_gray(image_path)
+    return phash(gray) if method == "phash" else dhash(gray)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", (text or "").lower())
+
+
+def text_similarity(a: str, b: str) -> float:
+    """Žodžių sekų panašumas (difflib ratio); skaičiai ir pavadinimai – atskiri žodžiai."""
+    wa, wb = _words(a), _words(b)
+    if not wa or not wb:
+        # be teksto nėra kuo patvirtinti
+        return 0.0
+    return difflib.SequenceMatcher(None, wa, wb, autojunk=False).ratio()
+
+
+class BKTree:
+    """Burkhard-Keller medis Hamming atstumui: paieška atmeta šakas pagal trikampio nelygybę."""
+
+    def __init__(self):
+        self.root: Optional[list] = None  # [hash, value, {distance: child}]
+        self.size = 0
+
+    def add(self, h: int, value: Any):
+        self.size += 1
+        if self.root is None:
+            self.root = [h, value, {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(h, node[0])
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, value, {}]
+                return
+            node = child
+
+    def search(self, h: int, max_dist: int) -> List[Tuple[int, int, Any]]:
+        """Visi (distance, hash, value), kurių atstumas <= max_dist, nuo artimiausio."""
+        if self.root is None:
+            return []
+        out = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= max_dist:
+                out.append((d, node[0], node[1]))
+            for cd, child in node[2].items():
+                if d - max_dist <= cd <= d + max_dist:
+                    stack.append(child)
+        out.sort(key=lambda x: x[0])
+        return out
+
+
+class DedupIndex:
+    """
+    Perceptual hash indeksas, tikrinamas prieš ocr_image.
+    Saugo ankstesnius rezultatus (document_type, fields, ocr_text, meta), kad beveik
+    identiški skenai galėtų juos pernaudoti be pilno OCR ir LLM.
+    threshold: hash'o atstumas kandidatams; min_similarity: kiek OCR tekstas turi sutapti.
+    """
+
+    def __init__(
+        self,
+        method: str = "phash",
+        threshold: int = DEFAULT_THRESHOLD,
+        path: Optional[str] = None,
+        min_similarity: float = DEFAULT_MIN_SIMILARITY,
+    ):
+        if method not in HASH_METHODS:
+            raise ValueError(f"Unknown hash method: {method} (expected one of {HASH_METHODS})")
+        self.method = method
+        self.threshold = threshold
+        self.min_similarity = min_similarity
+        self.path = path
+        self.tree = BKTree()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return self.tree.size
+
+    def __getstate__(self):
+        # perduodamas workeriams (ProcessPoolExecutor): Lock nepicklinamas
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def hash(self, image_path: str) -> int:
+        return image_hash(image_path, self.method)
+
+    def candidates(self, h: int) -> List[Tuple[int, int, Dict[str, Any]]]:
+        """Ankstesni rezultatai (distance, hash, result), kurių hash'as artimas; dar nepatvirtinti."""
+        with self._lock:
+            return self.tree.search(h, self.threshold)
+
+    def lookup(self, h: int, check_text: Callable[[], str]) -> Optional[Tuple[int, Dict[str, Any], float]]:
+        """
+        Patvirtintas ankstesnis rezultatas (distance, result, similarity) arba None.
+        check_text() grąžina naujo vaizdo OCR tekstą; kviečiamas tik jei yra kandidatų, daugiausia kartą.
+        """
+        hits = self.candidates(h)
+        if not hits:
+            return None
+        text = check_text()
+        for d, _, entry in hits:
+            sim = text_similarity(text, entry.get("ocr_text") or "")
+            if sim >= self.min_similarity:
+                return d, entry, sim
+        return None
+
+    def subset(self, h: int) -> "DedupIndex":
+        """Mažas indeksas tik su h kandidatais (perduoti workeriui, kuris patvirtins atitikmenį)."""
+        out = DedupIndex(method=self.method, threshold=self.threshold, min_similarity=self.min_similarity)
+        for _, ch, entry in self.candidates(h):
+            out.tree.add(ch, entry)
+        return out
+
+    def add(self, h: int, result: Dict[str, Any]):
+        entry = {k: result.get(k) for k in ("document_type", "fields", "ocr_text")}
+        entry["meta"] = {k: v for k, v in (result.get("meta") or {}).items() if k in _KEPT_META}
+        with self._lock:
+            self.tree.add(h, entry)
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.path
+        if not path:
+            return
+        entries = []
+        with self._lock:
+            stack = [self.tree.root] if self.tree.root else []
+            while stack:
+                node = stack.pop()
+                entries.append({"hash": f"{node[0]:016x}", "result": node[1]})
+                stack.extend(node[2].values())
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"method": self.method, "entries": entries}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def load(self, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            blob = json.load(f)
+        if blob.get("method") != self.method:
+            # kitas hash'o tipas – atstumai nepalyginami
+            return
+        for e in blob.get("entries", []):
+            self.tree.add(int(e["hash"], 16), e["result"])
+
+    def group(self, image_paths: List[str]) -> Tuple[List[str], Dict[str, Tuple[Optional[str], int]], Dict[str, int]]:
+        """
+        Batch'ui su workeriais: suskirsto vaizdus į atstovus ir galimus dublikatus iš anksto.
+        Returns (representatives, {candidate_path: (representative_path, distance)}, {path: hash}).
+        Jei kandidatas artimas jau indekse esančiam rezultatui, representative_path yra None.
+        Kandidatai dar turi būti patvirtinti OCR tekstu (lookup), todėl apdorojami po atstovų.
+        """
+        reps_tree = BKTree()
+        reps: List[str] = []
+        dups: Dict[str, Tuple[Optional[str], int]] = {}
+        hashes: Dict[str, int] = {}
+        for p in image_paths:
+            h = hashes[p] = self.hash(p)
+            prior = self.candidates(h)
+            if prior:
+                dups[p] = (None, prior[0][0])
+                continue
+            hits = reps_tree.search(h, self.threshold)
+            if hits:
+                dups[p] = (hits[0][2], hits[0][0])
+            else:
+                reps_tree.add(h, p)
+                reps.append(p)
+        return reps, dups, hashes
+
+
+def reused_result(prior: Dict[str, Any], image_path: str, distance: int, h: int, similarity: float) -> Dict[str, Any]:
+    """Ankstesnio rezultato kopija naujam failui su `meta` žyma apie pernaudojimą."""
+    data = copy.deepcopy({k: prior.get(k) for k in ("document_type", "fields", "ocr_text")})
+    meta = {k: v for k, v in (prior.get("meta") or {}).items() if k in _KEPT_META}
+    data["meta"] = {
+        **meta,
+        "source_image": image_path,
+        "dedup_reused": True,
+        "dedup_source_image": meta.get("source_image"),
+        "dedup_distance": distance,
+        "dedup_similarity": round(similarity, 3),
+        "dedup_hash": f"{h:016x}",
+    }
+    return data
@@ -1,15 +1,32 @@
 from __future__ import annotations
 
 import os
+import threading
 import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 import pandas as pd
 import matplotlib.pyplot as plt
 
 from .pipeline import process_image
-from .utils import list_images, ensure_dirs, get_timestamp_prefix
+from .dedup import DedupIndex, DEFAULT_MIN_SIMILARITY, DEFAULT_THRESHOLD
+from .pages import DEFAULT_PDF_DPI
+from .refine import DEFAULT_OCR_SCALE, DEFAULT_REFINE_CONF
+from .utils import list_images, ensure_dirs, get_timestamp_prefix, wait_annotations, atomic_output, atomic_write, save_json
 from .spinner import Spinner
+from .resources import plan_threads, init_worker, describe, memory_usage
+from .ocr import preload_reader
+from .llm import keep_alive_setting, llm_stats, merge_llm_stats, reset_llm_stats, warm_up
+from .classifier import configure_batching
+from .shard import SHARD_MANIFEST, load_manifest, missing_shards, select_shard, shard_outdir
 
 LABELS = ["email", "invoice", "news", "receipts"]
+PREDICTION_COLUMNS = [
+    "image", "true_label", "pred_label", "confidence", "method",
+    "processing_time", "dedup_reused", "second_pass_hit_rate",
+]
 
 def _true_label_from_path(path: str) -> str:
     # expects dataset/<label>/file.jpg
@@ -19,6 +36,130 @@ def _true_label_from_path(path: str) -> str:
             return p
     return "unknown"
 
+def _timed_process_image(img_path: str, job_kwargs: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+    img_start = time.time()
+    res = process_image(image_path=img_path, **job_kwargs)
+    return res, time.time() - img_start
+
+def _pool_task(img_path: str, job_kwargs: Dict[str, Any]) -> Tuple[Dict[str, Any], float, Dict[str, float], Dict[str, Any]]:
+    res, img_time = _timed_process_image(img_path, job_kwargs)
+    return res, img_time, memory_usage(), llm_stats()
+
+def _row(img_path: str, res: Dict[str, Any], img_time: float) -> Dict[str, Any]:
+    return {
+        "image": img_path,
+        "true_label": _true_label_from_path(img_path),
+        "pred_label": res.get("document_type"),
+        "confidence": res.get("meta", {}).get("classification_confidence"),
+        "method": res.get("meta", {}).get("classification_method"),
+        "processing_time": res.get("meta", {}).get("processing_time_seconds", img_time),
+        "dedup_reused": bool(res.get("meta", {}).get("dedup_reused", False)),
+        "second_pass_hit_rate": (res.get("meta", {}).get("second_pass") or {}).get("hit_rate"),
+    }
+
+@contextmanager
+def _worker_pool(
+    job_kwargs: Dict[str, Any],
+    plan: Dict[str, Any],
+    pin: bool,
+    share_weights: bool = False,
+) -> Iterator[ProcessPoolExecutor]:
+    """
+    Worker pool; each worker gets its own thread budget (and cores if pinned).
+    share_weights: load the OCR reader once here and fork workers, so the model weights
+    are shared copy-on-write instead of being loaded by every worker.
+    One pool serves every round of a batch (e.g. dedup candidates after their representatives).
+    """
+    ctx = mp.get_context()
+    if share_weights:
+        if job_kwargs.get("ocr_backend", "torch") != "torch":
+            # ONNX Runtime sessions own native thread pools that do not survive fork()
+            print("⚠️  --share-weights supports only the torch OCR backend; workers will load their own model.")
+        elif "fork" not in mp.get_all_start_methods():
+            print("⚠️  --share-weights needs fork() (Linux/macOS); workers will load their own model.")
+        else:
+            ctx = mp.get_context("fork")
+            spinner = Spinner("📦 Loading OCR model once for all workers")
+            spinner.start()
+            preload_reader(
+                job_kwargs.get("ocr_lang", "en"),
+                backend="torch",
+                quantize=job_kwargs.get("onnx_quantize", False),
+                threads=job_kwargs.get("ocr_threads", 0),
+            )
+            spinner.stop(f"✓ OCR model loaded (parent: {memory_usage()['rss']:.0f} MB RSS)")
+
+    with ProcessPoolExecutor(
+        max_workers=plan["workers"],
+        mp_context=ctx,
+        initializer=init_worker,
+        initargs=(plan, ctx.Value("i", 0), pin),
+    ) as pool:
+        yield pool
+
+def _run_pool(
+    pool: ProcessPoolExecutor,
+    images: List[str],
+    job_kwargs: Dict[str, Any],
+    plan: Dict[str, Any],
+    worker_mem: Dict[int, Dict[str, float]],
+    worker_llm: Dict[int, Dict[str, Any]],
+    per_image: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Tuple[Dict[str, Any], float]]:
+    """
+    Process images in the pool (see _worker_pool).
+    per_image: extra process_image kwargs for individual images (merged over job_kwargs).
+    worker_mem / worker_llm are updated in place: peak memory and latest LLM stats per worker pid.
+    Returns {image: (result, seconds)}.
+    """
+    results = {}
+    spinner = Spinner(f"[0/{len(images)}] Processing with {plan['workers']} workers")
+    spinner.start()
+    per_image = per_image or {}
+    futures = {pool.submit(_pool_task, p, dict(job_kwargs, **per_image.get(p, {}))): p for p in images}
+    for done, fut in enumerate(as_completed(futures), 1):
+        img_path = futures[fut]
+        res, img_time, mem, llm = fut.result()
+        prev = worker_mem.get(mem["pid"])
+        if prev is None or mem["rss"] > prev["rss"]:
+            worker_mem[mem["pid"]] = mem
+        # llm_stats() kaupiasi per visą workerio gyvenimą – užtenka paskutinės
+        if llm["requests"] >= worker_llm.get(mem["pid"], {}).get("requests", 0):
+            worker_llm[mem["pid"]] = llm
+        results[img_path] = (res, img_time)
+        spinner.stop(f"✓ [{done}/{len(images)}] {os.path.basename(img_path)} → {res.get('document_type')} ({img_time:.2f}s)")
+        spinner = Spinner(f"[{done}/{len(images)}] Processing with {plan['workers']} workers")
+        spinner.start()
+    spinner.stop()
+    return results
+
+def _run_threads(
+    images: List[str],
+    job_kwargs: Dict[str, Any],
+    in_flight: int,
+) -> Dict[str, Tuple[Dict[str, Any], float]]:
+    """
+    Keli dokumentai vienu metu viename procese: kol vienas laukia LLM, kitas daromas OCR,
+    o jų klasifikavimo užklausimai sujungiami į vieną LLM kvietimą (classifier.configure_batching).
+    OCR vyksta po vieną (bendras ocr_lock): kiekvienas OCR kvietimas jau naudoja visą
+    threads_per_worker biudžetą, todėl persidengia tik LLM žingsniai.
+    """
+    job_kwargs = dict(job_kwargs, ocr_lock=threading.Lock())
+    results = {}
+    spinner = Spinner(f"[0/{len(images)}] Processing ({in_flight} in flight)")
+    spinner.start()
+    with ThreadPoolExecutor(max_workers=in_flight, thread_name_prefix="doc") as pool:
+        futures = {pool.submit(_timed_process_image, p, job_kwargs): p for p in images}
+        for done, fut in enumerate(as_completed(futures), 1):
+            img_path = futures[fut]
+            res, img_time = fut.result()
+            results[img_path] = (res, img_time)
+            spinner.stop(f"✓ [{done}/{len(images)}] {os.path.basename(img_path)} → {res.get('document_type')} ({img_time:.2f}s)")
+            spinner = Spinner(f"[{done}/{len(images)}] Processing ({in_flight} in flight)")
+            spinner.start()
+    spinner.stop()
+    return results
+
 def run_batch(
     dataset_dir: str,
     outdir: str = "results",
@@ -27,9 +168,33 @@ def run_batch(
     limit: int = 0,
     ocr_lang: str = "en",
     annotate: bool = False,
+    ocr_backend: str = "torch",
+    onnx_quantize: bool = False,
+    ocr_threads: int = 0,
+    workers: int = 1,
+    thread_plan: Optional[Dict[str, Any]] = None,
+    pin_threads: bool = False,
+    share_weights: bool = False,
+    dedup: bool = False,
+    dedup_threshold: int = DEFAULT_THRESHOLD,
+    dedup_method: str = "phash",
+    dedup_min_similarity: float = DEFAULT_MIN_SIMILARITY,
+    page_workers: int = 2,
+    classify_pages: int = 1,
+    pdf_dpi: int = DEFAULT_PDF_DPI,
+    save_boxes: bool = False,
+    two_pass: bool = False,
+    ocr_scale: float = DEFAULT_OCR_SCALE,
+    refine_conf: float = DEFAULT_REFINE_CONF,
+    llm_batch: int = 1,
+    llm_batch_chars: int = 12000,
+    shard: Optional[Tuple[int, int]] = None,
 ):
+    """
+    shard: (i, N) – process only images whose path hashes to shard i of N and write
+    everything to <outdir>/shard-i-of-N; merge_shards() combines the finished shards.
+    """
     batch_start_time = time.time()
-    ensure_dirs(outdir)
 
     # Collect images per label
     label_images = {}
@@ -57,80 +222,295 @@ def run_batch(
             for lab_imgs in label_images.values():
                 images.extend(lab_imgs)
 
+    if shard is not None:
+        # the same sorted list (and limit) on every machine, split by path hash
+        total = len(images)
+        images = select_shard(images, dataset_dir, *shard)
+        outdir = shard_outdir(outdir, *shard)
+        # a manifest left by an earlier run would let merge_shards treat this shard
+        # as finished while it is still running (or after it has crashed)
+        manifest_path = os.path.join(outdir, SHARD_MANIFEST)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        print(f"🧩 Shard {shard[0]}/{shard[1]}: {len(images)} of {total} images → {outdir}")
+    ensure_dirs(outdir)
+
     print(f"\n🚀 Batch processing: {len(images)} images\n")
-    rows = []
-    for idx, img_path in enumerate(images, 1):
-        # Progress spinner for each image
-        spinner = Spinner(f"[{idx}/{len(images)}] Processing {os.path.basename(img_path)}")
+
+    plan = thread_plan or plan_threads(workers=workers)
+    if plan["workers"] > 1:
+        print(f"🧵 Workers: {describe(plan)}\n")
+    if not ocr_threads:
+        ocr_threads = plan["threads_per_worker"]
+
+    job_kwargs = dict(
+        outdir=outdir,
+        model=model,
+        use_llm=use_llm,
+        ocr_lang=ocr_lang,
+        annotate=annotate,
+        show_spinner=False,  # Disable inner spinner in batch mode
+        ocr_backend=ocr_backend,
+        onnx_quantize=onnx_quantize,
+        ocr_threads=ocr_threads,
+        page_workers=page_workers,
+        classify_pages=classify_pages,
+        pdf_dpi=pdf_dpi,
+        save_boxes=save_boxes,
+        two_pass=two_pass,
+        ocr_scale=ocr_scale,
+        refine_conf=refine_conf,
+    )
+
+    # Model stays loaded in Ollama for the whole batch instead of paying a cold load after idle gaps
+    warmup = None
+    if use_llm:
+        reset_llm_stats()
+        spinner = Spinner(f"🔥 Loading {model} in Ollama (keep_alive={keep_alive_setting()})")
         spinner.start()
+        warmup = warm_up(model)
+        spinner.stop(f"✓ {model} loaded ({warmup:.2f}s)\n" if warmup is not None
+                     else "⚠️  Ollama not reachable; LLM steps will fall back to rules\n")
+
+    batch_llm = use_llm and llm_batch > 1
+    if batch_llm and plan["workers"] > 1:
+        # batcher'is sujungia užklausimus tik viename procese, o workeris vienu metu turi vieną dokumentą
+        print("⚠️  --llm-batch is ignored with --workers > 1; use --workers 1 --llm-batch N.\n")
+        batch_llm = False
+
+    # Near-duplicate scans reuse earlier results; the index persists across runs in outdir
+    dedup_index = None
+    if dedup:
+        dedup_index = DedupIndex(method=dedup_method, threshold=dedup_threshold,
+                                 path=os.path.join(outdir, "dedup_index.json"),
+                                 min_similarity=dedup_min_similarity)
+
+    rows = []
+    worker_mem: Dict[int, Dict[str, float]] = {}
+    batch_llm_stats: Dict[str, Any] = {}
+    if plan["workers"] > 1:
+        todo, dups, hashes = (images, {}, {})
+        if dedup_index is not None:
+            # workers do not share the index: hash candidates are found up front and processed
+            # after their representatives, each worker confirming the match by OCR text
+            todo, dups, hashes = dedup_index.group(images)
+            print(f"♻️  Dedup: {len(dups)} near-duplicate candidate(s) will be checked against earlier results\n")
+        worker_llm: Dict[int, Dict[str, Any]] = {}
+        with _worker_pool(job_kwargs, plan, pin_threads, share_weights=share_weights) as pool:
+            results = _run_pool(pool, todo, job_kwargs, plan, worker_mem, worker_llm)
+            for img_path in todo:
+                if dedup_index is not None:
+                    dedup_index.add(hashes[img_path], results[img_path][0])
+            if dups:
+                # the same workers (model already loaded) check the candidates
+                per_image = {p: {"dedup_index": dedup_index.subset(hashes[p])} for p in dups}
+                results.update(_run_pool(pool, list(dups), job_kwargs, plan, worker_mem, worker_llm,
+                                         per_image=per_image))
+                for img_path in dups:
+                    res = results[img_path][0]
+                    if not res.get("meta", {}).get("dedup_reused"):
+                        dedup_index.add(hashes[img_path], res)
+        batch_llm_stats = merge_llm_stats(list(worker_llm.values()))
+        # keep CSV order identical to serial mode
+        rows = [_row(p, *results[p]) for p in images]
+    elif batch_llm:
+        configure_batching(max_batch=llm_batch, max_chars=llm_batch_chars)
+        try:
+            results = _run_threads(images, dict(job_kwargs, dedup_index=dedup_index), in_flight=llm_batch)
+        finally:
+            configure_batching(max_batch=1)
+        rows = [_row(p, *results[p]) for p in images]
+    else:
+        for idx, img_path in enumerate(images, 1):
+            # Progress spinner for each image
+            spinner = Spinner(f"[{idx}/{len(images)}] Processing {os.path.basename(img_path)}")
+            spinner.start()
+
+            res, img_time = _timed_process_image(img_path, dict(job_kwargs, dedup_index=dedup_index))
+            row = _row(img_path, res, img_time)
+
+            # Stop spinner with result
+            spinner.stop(f"✓ [{idx}/{len(images)}] {os.path.basename(img_path)} → {row['pred_label']} ({img_time:.2f}s)")
+            rows.append(row)
 
-        img_start = time.time()
-        res = process_image(
-            image_path=img_path,
-            outdir=outdir,
-            model=model,
-            use_llm=use_llm,
-            ocr_lang=ocr_lang,
-            annotate=annotate,
-            show_spinner=False,  # Disable inner spinner in batch mode
-        )
-        img_time = time.time() - img_start
-        pred = res.get("document_type")
-        true = _true_label_from_path(img_path)
-
-        # Stop spinner with result
-        spinner.stop(f"✓ [{idx}/{len(images)}] {os.path.basename(img_path)} → {pred} ({img_time:.2f}s)")
-
-        rows.append({
-            "image": img_path,
-            "true_label": true,
-            "pred_label": pred,
-            "confidence": res.get("meta", {}).get("classification_confidence"),
-            "method": res.get("meta", {}).get("classification_method"),
-            "processing_time": res.get("meta", {}).get("processing_time_seconds", img_time),
-        })
+    if use_llm and not batch_llm_stats:
+        batch_llm_stats = llm_stats()
+    if dedup_index is not None:
+        dedup_index.save()
+    if annotate:
+        wait_annotations()
+
+    batch_total_time = time.time() - batch_start_time
 
     # Generate metrics with spinner
     print()  # Add newline
     spinner = Spinner("📊 Generating metrics and confusion matrix")
     spinner.start()
 
-    df = pd.DataFrame(rows)
+    df = pd.DataFrame(rows, columns=PREDICTION_COLUMNS)
     timestamp = get_timestamp_prefix()
     metrics_path = os.path.join(outdir, "metrics", f"{timestamp}-predictions.csv")
-    df.to_csv(metrics_path, index=False)
+    with atomic_output(metrics_path) as tmp:
+        df.to_csv(tmp, index=False)
 
-    batch_total_time = time.time() - batch_start_time
+    metrics = BatchMetrics()
+    metrics.update(df)
+
+    sections = []
+    if use_llm:
+        sections.append(("LLM", _llm_lines(batch_llm_stats, keep_alive_setting(), warmup, batch_llm)))
+    if worker_mem:
+        mem_lines = [f"Shared weights: {'yes' if share_weights else 'no'}"]
+        for pid, mem in sorted(worker_mem.items()):
+            mem_lines.append(f"pid {pid}: rss={mem['rss']:.0f} pss={mem['pss']:.0f} uss={mem['uss']:.0f}")
+        avg_uss = sum(m["uss"] for m in worker_mem.values()) / len(worker_mem)
+        mem_lines.append(f"Average private (uss) per worker: {avg_uss:.0f}")
+        sections.append(("Worker Memory (peak, MB)", mem_lines))
+
+    summary_path, plot_path = write_report(
+        metrics, outdir, timestamp, batch_total_time,
+        timing_lines=[f"Workers: {describe(plan)}"], sections=sections, dedup=dedup, two_pass=two_pass,
+    )
+    spinner.stop(f"✓ Metrics generated (Accuracy: {metrics.accuracy:.3f})")
+
+    if shard is not None:
+        # manifestas rašomas paskutinis: jo buvimas reiškia, kad shard'as baigtas
+        manifest = {
+            "shard": shard[0],
+            "count": shard[1],
+            "images": len(images),
+            "predictions": os.path.relpath(metrics_path, outdir),
+            "started_at": batch_start_time,
+            "finished_at": time.time(),
+            "batch_time": batch_total_time,
+            "workers": describe(plan),
+            "dedup": dedup,
+            "two_pass": two_pass,
+            "use_llm": use_llm,
+            "llm_batch": batch_llm,
+            "keep_alive": keep_alive_setting(),
+            "warmup_seconds": warmup,
+            "llm": batch_llm_stats,
+        }
+        save_json(manifest, outdir, SHARD_MANIFEST)
+
+    _print_results(metrics, [metrics_path, summary_path, plot_path], batch_total_time)
+
+def _llm_lines(st: Dict[str, Any], keep_alive: Union[str, int], warmup: Optional[float], batched: bool) -> List[str]:
+    lines = [
+        f"Keep-alive: {keep_alive}",
+        f"Warm-up load: {f'{warmup:.2f}s' if warmup is not None else 'n/a (Ollama not reachable)'}",
+        f"Requests: {st.get('requests', 0)}",
+        f"Cold starts: {st.get('cold_starts', 0)} ({st.get('cold_load_seconds', 0.0):.2f}s loading)",
+    ]
+    if batched:
+        n_batches = st.get("batches", 0)
+        avg_batch = st.get("batched_requests", 0) / n_batches if n_batches else 0.0
+        lines.append(f"Classification batches: {n_batches} (avg size {avg_batch:.2f}, max {st.get('max_batch', 0)})")
+        lines.append(f"Batch fallbacks (single-document retries): {st.get('batch_fallbacks', 0)}")
+    return lines
+
+class BatchMetrics:
+    """
+    Predikcijų metrikos, kaupiamos dalimis (DataFrame chunk'ais), kad merge galėtų
+    sujungti shard'ų CSV neįkeldamas jų visų į atmintį.
+    """
+
+    def __init__(self):
+        self.images = 0
+        self.known = 0
+        self.correct = 0
+        self.time_sum = 0.0
+        self.time_count = 0
+        self.time_min: Optional[float] = None
+        self.time_max: Optional[float] = None
+        self.dedup_reused = 0
+        self.hit_rate_sum = 0.0
+        self.hit_rate_count = 0
+        self.confusion = pd.DataFrame(0, index=LABELS, columns=LABELS)
+
+    def update(self, df: pd.DataFrame):
+        if not len(df):
+            return
+        self.images += len(df)
+
+        # accuracy (ignore unknown)
+        known = df[df["true_label"].isin(LABELS)]
+        self.known += len(known)
+        self.correct += int((known["true_label"] == known["pred_label"]).sum())
+        for (t, p), n in known.groupby(["true_label", "pred_label"]).size().items():
+            if p in LABELS:
+                self.confusion.loc[t, p] += int(n)
+
+        # timing statistics
+        times = df["processing_time"].dropna()
+        if len(times):
+            self.time_sum += float(times.sum())
+            self.time_count += len(times)
+            self.time_min = min(float(times.min()), self.time_min if self.time_min is not None else float("inf"))
+            self.time_max = max(float(times.max()), self.time_max if self.time_max is not None else float("-inf"))
 
-    # accuracy (ignore unknown)
-    df_known = df[df["true_label"].isin(LABELS)]
-    acc = (df_known["true_label"] == df_known["pred_label"]).mean() if len(df_known) else 0.0
+        self.dedup_reused += int(df["dedup_reused"].astype(bool).sum())
+        hit = df["second_pass_hit_rate"].dropna()
+        self.hit_rate_sum += float(hit.sum())
+        self.hit_rate_count += len(hit)
 
-    # timing statistics
-    avg_time = df["processing_time"].mean() if "processing_time" in df.columns else 0.0
-    min_time = df["processing_time"].min() if "processing_time" in df.columns else 0.0
-    max_time = df["processing_time"].max() if "processing_time" in df.columns else 0.0
+    @property
+    def accuracy(self) -> float:
+        return self.correct / self.known if self.known else 0.0
+
+    @property
+    def avg_time(self) -> float:
+        return self.time_sum / self.time_count if self.time_count else 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hit_rate_sum / self.hit_rate_count if self.hit_rate_count else float("nan")
+
+def write_report(
+    metrics: BatchMetrics,
+    outdir: str,
+    timestamp: str,
+    batch_total_time: float,
+    timing_lines: List[str] = (),
+    sections: List[Tuple[str, List[str]]] = (),
+    dedup: bool = False,
+    two_pass: bool = False,
+) -> Tuple[str, Optional[str]]:
+    """
+    summary.txt and confusion matrix plot in <outdir>/metrics (both written atomically).
+    timing_lines: extra lines for the timing section; sections: (title, lines) appended at the end.
+    Returns (summary_path, plot_path or None).
+    """
+    acc = metrics.accuracy
+    lines = [
+        f"Images: {metrics.images}",
+        f"Known-label images: {metrics.known}",
+        f"Accuracy: {acc:.3f}",
+    ]
+    if dedup:
+        lines.append(f"Dedup reused: {metrics.dedup_reused}")
+    if two_pass:
+        lines.append(f"Second-pass hit rate (avg): {metrics.hit_rate:.3f}")
+    lines += [
+        "",
+        "=== Timing Statistics ===",
+        f"Total batch time: {batch_total_time:.2f}s",
+        f"Average per image: {metrics.avg_time:.3f}s",
+        f"Min time: {metrics.time_min or 0.0:.3f}s",
+        f"Max time: {metrics.time_max or 0.0:.3f}s",
+        *timing_lines,
+    ]
+    for title, body in sections:
+        lines += ["", f"=== {title} ===", *body]
 
     summary_path = os.path.join(outdir, "metrics", f"{timestamp}-summary.txt")
-    with open(summary_path, "w", encoding="utf-8") as f:
-        f.write(f"Images: {len(df)}\n")
-        f.write(f"Known-label images: {len(df_known)}\n")
-        f.write(f"Accuracy: {acc:.3f}\n")
-        f.write(f"\n=== Timing Statistics ===\n")
-        f.write(f"Total batch time: {batch_total_time:.2f}s\n")
-        f.write(f"Average per image: {avg_time:.3f}s\n")
-        f.write(f"Min time: {min_time:.3f}s\n")
-        f.write(f"Max time: {max_time:.3f}s\n")
+    atomic_write(summary_path, "\n".join(lines) + "\n")
 
     # confusion matrix plot
-    if len(df_known):
-        cm = pd.crosstab(df_known["true_label"], df_known["pred_label"], rownames=["true"], colnames=["pred"], dropna=False)
-        for l in LABELS:
-            if l not in cm.index:
-                cm.loc[l] = 0
-            if l not in cm.columns:
-                cm[l] = 0
-        cm = cm.loc[LABELS, LABELS]
+    plot_path = None
+    if metrics.known:
+        cm = metrics.confusion.loc[LABELS, LABELS]
 
         plt.figure()
         plt.imshow(cm.values)
@@ -144,19 +524,75 @@ def run_batch(
         plt.title(f"Confusion Matrix (acc={acc:.3f})")
         plot_path = os.path.join(outdir, "metrics", f"{timestamp}-confusion_matrix.png")
         plt.tight_layout()
-        plt.savefig(plot_path, dpi=150)
+        with atomic_output(plot_path) as tmp:
+            plt.savefig(tmp, dpi=150, format="png")
         plt.close()
 
-    spinner.stop(f"✓ Metrics generated (Accuracy: {acc:.3f})")
+    return summary_path, plot_path
 
+def _print_results(metrics: BatchMetrics, paths: List[Optional[str]], batch_total_time: float):
     print(f"\n=== Results ===")
-    print(f"Saved: {metrics_path}")
-    print(f"Saved: {summary_path}")
-    plot_path_check = os.path.join(outdir, "metrics", f"{timestamp}-confusion_matrix.png")
-    if os.path.exists(plot_path_check):
-        print(f"Saved: {plot_path_check}")
-    print(f"\nAccuracy: {acc:.3f}")
+    for path in paths:
+        if path and os.path.exists(path):
+            print(f"Saved: {path}")
+    print(f"\nAccuracy: {metrics.accuracy:.3f}")
     print(f"\n=== Timing ===")
     print(f"Total batch time: {batch_total_time:.2f}s")
-    print(f"Average per image: {avg_time:.3f}s")
-    print(f"Images processed: {len(df)}")
+    print(f"Average per image: {metrics.avg_time:.3f}s")
+    print(f"Images processed: {metrics.images}")
+
+def merge_shards(outdir: str, count: int, chunksize: int = 50_000):
+    """
+    Sujungia `count` shard'ų rezultatus (<outdir>/shard-i-of-N) į tą pačią ataskaitą kaip run_batch:
+    <outdir>/metrics/<timestamp>-predictions.csv, -summary.txt ir -confusion_matrix.png.
+    Shard'ų CSV skaitomi dalimis, metrikos kaupiamos BatchMetrics.
+    """
+    missing = missing_shards(outdir, count)
+    if missing:
+        raise RuntimeError(f"Shards not finished (no {SHARD_MANIFEST}): {', '.join(map(str, missing))}")
+    manifests = [load_manifest(outdir, i, count) for i in range(count)]
+
+    ensure_dirs(outdir)
+    spinner = Spinner(f"📊 Merging {count} shards")
+    spinner.start()
+
+    timestamp = get_timestamp_prefix()
+    metrics = BatchMetrics()
+    metrics_path = os.path.join(outdir, "metrics", f"{timestamp}-predictions.csv")
+    with atomic_output(metrics_path) as tmp:
+        pd.DataFrame(columns=PREDICTION_COLUMNS).to_csv(tmp, index=False)
+        for i, m in enumerate(manifests):
+            path = os.path.join(shard_outdir(outdir, i, count), m["predictions"])
+            for chunk in pd.read_csv(path, chunksize=chunksize):
+                chunk = chunk.reindex(columns=PREDICTION_COLUMNS)
+                metrics.update(chunk)
+                chunk.to_csv(tmp, mode="a", header=False, index=False)
+
+    # shard'ai vyksta lygiagrečiai: bendras laikas nuo pirmo starto iki paskutinės pabaigos
+    batch_total_time = max(m["finished_at"] for m in manifests) - min(m["started_at"] for m in manifests)
+    shard_times = [m["batch_time"] for m in manifests]
+    timing_lines = [
+        f"Shards: {count} (slowest {max(shard_times):.2f}s, fastest {min(shard_times):.2f}s, "
+        f"sum {sum(shard_times):.2f}s)",
+        *(f"Shard {m['shard']}: {m['images']} images, {m['batch_time']:.2f}s, workers {m['workers']}" for m in manifests),
+    ]
+    sections = []
+    llm_shards = [m for m in manifests if m.get("use_llm")]
+    if llm_shards:
+        warmups = [m["warmup_seconds"] for m in llm_shards if m.get("warmup_seconds") is not None]
+        sections.append(("LLM", _llm_lines(
+            merge_llm_stats([m.get("llm") or {} for m in llm_shards]),
+            llm_shards[0].get("keep_alive", keep_alive_setting()),
+            max(warmups) if warmups else None,
+            any(m.get("llm_batch") for m in llm_shards),
+        )))
+
+    summary_path, plot_path = write_report(
+        metrics, outdir, timestamp, batch_total_time,
+        timing_lines=timing_lines,
+        sections=sections,
+        dedup=any(m.get("dedup") for m in manifests),
+        two_pass=any(m.get("two_pass") for m in manifests),
+    )
+    spinner.stop(f"✓ Merged {count} shards (Accuracy: {metrics.accuracy:.3f})")
+    _print_results(metrics, [metrics_path, summary_path, plot_path], batch_total_time)
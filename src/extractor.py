@@ -1,8 +1,8 @@
 from __future__ import annotations
 
 import re
-from typing import Dict, Any
-from .llm import ollama_json
+from typing import Dict, Any, List, Tuple
+from .llm import ollama_json, ollama_json_async
 
 # ---- Simple regex helpers (fallbacks) ----
 
@@ -98,19 +98,8 @@ def _news_fallback(text: str) -> Dict[str, Any]:
 
 # ---- Text focusing (VERY important for small local models) ----
 
-def _focus_text(text: str, doc_type: str) -> str:
-    """
-    Small local models (phi3, etc.) work better if we feed only relevant parts.
-    """
-    t = (text or "").strip()
-    if not t:
-        return ""
-
-    lines = [ln.rstrip() for ln in t.splitlines()]
-
-    # Common: top section contains header info
-    top = "\n".join([ln for ln in lines[:70] if ln.strip()])
-
+def _focus_ranges(lines: List[str], doc_type: str) -> List[Tuple[int, int]]:
+    """Line ranges [start, end) that _focus_text keeps for a document type."""
     def find_block_start(keywords):
         for i, ln in enumerate(lines):
             low = ln.lower()
@@ -118,40 +107,81 @@ def _focus_text(text: str, doc_type: str) -> str:
                 return i
         return None
 
+    n = len(lines)
+    # Common: top section contains header info
+    top = (0, min(70, n))
+
     if doc_type == "invoice":
         # bottom: summary/total blocks
         s = find_block_start(["summary", "total", "gross worth", "vat"])
-        bottom = "\n".join([ln for ln in (lines[s:s+120] if s is not None else lines[-120:]) if ln.strip()])
-        return top + "\n\n----\n\n" + bottom
+        return [top, (s, min(s + 120, n)) if s is not None else (max(0, n - 120), n)]
 
     if doc_type == "receipts":
         # receiptss often have totals near bottom
         s = find_block_start(["total", "sum", "amount", "paid", "cash", "card"])
-        bottom = "\n".join([ln for ln in (lines[s:s+100] if s is not None else lines[-100:]) if ln.strip()])
-        return top + "\n\n----\n\n" + bottom
+        return [top, (s, min(s + 100, n)) if s is not None else (max(0, n - 100), n)]
 
     if doc_type == "email":
         # email headers near top
-        return "\n".join([ln for ln in lines[:120] if ln.strip()])
+        return [(0, min(120, n))]
 
     # news: keep start + small body (avoid huge)
-    body = "\n".join([ln for ln in lines[:250] if ln.strip()])
-    return body[:9000]
+    return [(0, min(250, n))]
 
 
-# ---- Dynamic LLM extraction ----
+def _focus_text(text: str, doc_type: str) -> str:
+    """
+    Small local models (phi3, etc.) work better if we feed only relevant parts.
+    """
+    t = (text or "").strip()
+    if not t:
+        return ""
 
-def extract_fields(text: str, doc_type: str, model: str = "phi3", use_llm: bool = True) -> Dict[str, Any]:
+    lines = [ln.rstrip() for ln in t.splitlines()]
+    ranges = _focus_ranges(lines, doc_type)
+
+    def block(a, b):
+        return "\n".join([ln for ln in lines[a:b] if ln.strip()])
+
+    if doc_type in ("invoice", "receipts"):
+        return block(*ranges[0]) + "\n\n----\n\n" + block(*ranges[1])
+
+    if doc_type == "email":
+        return block(*ranges[0])
+
+    return block(*ranges[0])[:9000]
+
+
+def focus_pages(page_texts: List[str], doc_type: str) -> List[int]:
     """
-    Extract structured fields.
-    - LLM returns dynamic `fields`.
-    - Fallback regex extraction if LLM is disabled/unavailable or JSON parsing fails.
+    Multi-page documents: indices of the pages whose lines _focus_text would keep,
+    so extraction only sees those pages (e.g. first page + the page with totals).
     """
-    doc_type = (doc_type or "").strip().lower()
+    joined = "\n".join(page_texts)
+    # _focus_text works on the stripped text; count leading lines it drops
+    lead = len(joined) - len(joined.lstrip())
+    offset = joined[:lead].count("\n")
+    lines = joined.strip().splitlines()
+    if not lines:
+        return list(range(len(page_texts)))
+
+    # global line index -> page index
+    line_page = []
+    for page_idx, pt in enumerate(page_texts):
+        line_page.extend([page_idx] * (pt.count("\n") + 1))
+
+    keep = set()
+    for a, b in _focus_ranges(lines, doc_type):
+        for i in range(a, b):
+            gi = i + offset
+            if gi < len(line_page):
+                keep.add(line_page[gi])
+    return sorted(keep)
 
-    if not use_llm:
-        return _fallback(text, doc_type)
 
+# ---- Dynamic LLM extraction ----
+
+def _extraction_prompt(text: str, doc_type: str) -> str:
     focused = _focus_text(text, doc_type)
 
     # Strong, doc-type-specific guidance helps phi3 a lot
@@ -186,7 +216,7 @@ News extraction hints:
 - summary: optional 1-2 sentences.
 """
 
-    prompt = f"""You extract structured information from OCR text.
+    return f"""You extract structured information from OCR text.
 
 Document type: {doc_type}
 
@@ -215,7 +245,8 @@ OCR text:
 {focused}
 """
 
-    obj, _raw = ollama_json(prompt, model=model, temperature=0.0)
+
+def _parse_extraction(obj, text: str, doc_type: str) -> Dict[str, Any]:
     if isinstance(obj, dict) and str(obj.get("document_type", "")).strip().lower() == doc_type:
         if isinstance(obj.get("fields"), dict) and obj["fields"]:
             # Hard limits
@@ -227,6 +258,32 @@ OCR text:
     return _fallback(text, doc_type)
 
 
+def extract_fields(text: str, doc_type: str, model: str = "phi3", use_llm: bool = True) -> Dict[str, Any]:
+    """
+    Extract structured fields.
+    - LLM returns dynamic `fields`.
+    - Fallback regex extraction if LLM is disabled/unavailable or JSON parsing fails.
+    """
+    doc_type = (doc_type or "").strip().lower()
+
+    if not use_llm:
+        return _fallback(text, doc_type)
+
+    obj, _raw = ollama_json(_extraction_prompt(text, doc_type), model=model, temperature=0.0)
+    return _parse_extraction(obj, text, doc_type)
+
+
+async def extract_fields_async(text: str, doc_type: str, model: str = "phi3", use_llm: bool = True, session=None) -> Dict[str, Any]:
+    """Async variant of extract_fields (aiohttp); `session` is an optional shared aiohttp.ClientSession."""
+    doc_type = (doc_type or "").strip().lower()
+
+    if not use_llm:
+        return _fallback(text, doc_type)
+
+    obj, _raw = await ollama_json_async(_extraction_prompt(text, doc_type), model=model, temperature=0.0, session=session)
+    return _parse_extraction(obj, text, doc_type)
+
+
 def _fallback(text: str, doc_type: str) -> Dict[str, Any]:
     if doc_type == "email":
         return _email_fallback(text)
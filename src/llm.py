@@ -1,11 +1,87 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import os
 import re
+import threading
+import time
 import requests
-from typing import Any, Dict, Optional, Tuple
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 OLLAMA_URL = "http://localhost:11434/api/generate"
+# Kiek laiko Ollama laiko modelį atmintyje po paskutinio kvietimo (numatyta serverio reikšmė – 5m).
+DEFAULT_KEEP_ALIVE = "30m"
+# Go time.ParseDuration formatas, pvz. 30m, 1h30m, 90s (be vieneto Ollama eilutės nepriima)
+_DURATION_RE = re.compile(r"-?((\d+(\.\d*)?|\.\d+)(ns|us|µs|μs|ms|s|m|h))+")
+# load_duration virš šios ribos laikomas "šaltu startu" (modelis buvo iškeltas iš atminties)
+COLD_START_SECONDS = 1.0
+
+_STATS_LOCK = threading.Lock()
+_STATS: Dict[str, Any] = {}
+
+def parse_keep_alive(value: Union[str, int]) -> Union[str, int]:
+    """
+    keep_alive reikšmė užklausai: sveikas skaičius (sekundės; -1 – visam laikui, 0 – iškelti iškart)
+    siunčiamas kaip JSON skaičius, trukmė (30m, 1h) – kaip eilutė.
+    """
+    v = str(value).strip()
+    if re.fullmatch(r"-?\d+", v):
+        return int(v)
+    if _DURATION_RE.fullmatch(v):
+        return v
+    raise ValueError(f"Invalid keep_alive: {value!r} (expected seconds like -1 / 300 or a duration like 30m, 1h)")
+
+def keep_alive_setting() -> Union[str, int]:
+    """OLLAMA_KEEP_ALIVE (tas pats kintamasis, kurį skaito Ollama serveris) arba 30m; skaitoma kiekvieną kartą."""
+    try:
+        return parse_keep_alive(os.environ.get("OLLAMA_KEEP_ALIVE", DEFAULT_KEEP_ALIVE))
+    except ValueError:
+        return DEFAULT_KEEP_ALIVE
+
+def reset_llm_stats():
+    with _STATS_LOCK:
+        _STATS.clear()
+        _STATS.update({
+            "requests": 0,
+            "cold_starts": 0,
+            "cold_load_seconds": 0.0,
+            "warmup_seconds": None,
+            "batches": 0,
+            "batched_requests": 0,
+            "max_batch": 0,
+            "batch_fallbacks": 0,
+        })
+
+reset_llm_stats()
+
+def llm_stats() -> Dict[str, Any]:
+    """Šio proceso LLM statistikos kopija (kvietimai, šalti startai, batch'ai)."""
+    with _STATS_LOCK:
+        return dict(_STATS)
+
+def merge_llm_stats(parts: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sujungia kelių procesų (workerių) llm_stats()."""
+    out: Dict[str, Any] = {}
+    for st in parts:
+        for k, v in st.items():
+            if k == "max_batch":
+                out[k] = max(out.get(k, 0), v)
+            elif k == "warmup_seconds":
+                out[k] = v if out.get(k) is None else out[k]
+            else:
+                out[k] = out.get(k, 0) + v
+    return out
+
+def _record_response(data: Dict[str, Any]):
+    # Ollama grąžina load_duration nanosekundėmis
+    load = (data.get("load_duration") or 0) / 1e9
+    with _STATS_LOCK:
+        _STATS["requests"] += 1
+        if load >= COLD_START_SECONDS:
+            _STATS["cold_starts"] += 1
+            _STATS["cold_load_seconds"] += load
 
 def _extract_json(text: str) -> Optional[Dict[str, Any]]:
     """Extract the first JSON object from model output."""
@@ -26,7 +102,13 @@ def _extract_json(text: str) -> Optional[Dict[str, Any]]:
         except json.JSONDecodeError:
             return None
 
-def ollama_generate(prompt: str, model: str = "phi3", temperature: float = 0.0, timeout: int = 120) -> str:
+def ollama_generate(
+    prompt: str,
+    model: str = "phi3",
+    temperature: float = 0.0,
+    timeout: int = 120,
+    keep_alive: Optional[Union[str, int]] = None,
+) -> str:
     try:
         r = requests.post(
             OLLAMA_URL,
@@ -34,17 +116,211 @@ def ollama_generate(prompt: str, model: str = "phi3", temperature: float = 0.0,
                 "model": model,
                 "prompt": prompt,
                 "stream": False,
+                "keep_alive": keep_alive if keep_alive is not None else keep_alive_setting(),
                 "options": {"temperature": temperature},
             },
             timeout=timeout,
         )
         r.raise_for_status()
-        return r.json().get("response", "")
+        data = r.json()
+        _record_response(data)
+        return data.get("response", "")
     except requests.exceptions.RequestException:
         # Ollama not running / not installed / blocked
         return ""
 
+def warm_up(model: str = "phi3", keep_alive: Optional[Union[str, int]] = None, timeout: int = 300) -> Optional[float]:
+    """
+    Įkelia modelį į Ollama atmintį prieš batch'ą (užklausa be prompt'o tik užkrauna modelį)
+    ir nustato keep_alive, kad jis nebūtų iškeltas tarp dokumentų.
+    Returns load seconds (None jei Ollama nepasiekiamas).
+    """
+    start = time.time()
+    try:
+        r = requests.post(
+            OLLAMA_URL,
+            json={
+                "model": model,
+                "keep_alive": keep_alive if keep_alive is not None else keep_alive_setting(),
+                "stream": False,
+            },
+            timeout=timeout,
+        )
+        r.raise_for_status()
+        data = r.json()
+    except requests.exceptions.RequestException:
+        return None
+    load = (data.get("load_duration") or 0) / 1e9 or (time.time() - start)
+    with _STATS_LOCK:
+        _STATS["warmup_seconds"] = round(load, 3)
+    return load
+
 def ollama_json(prompt: str, model: str = "phi3", temperature: float = 0.0) -> Tuple[Optional[Dict[str, Any]], str]:
     """Call Ollama and try to parse JSON. Returns (json_or_none, raw_text)."""
     raw = ollama_generate(prompt, model=model, temperature=temperature)
     return _extract_json(raw), raw
+
+async def ollama_generate_async(
+    prompt: str,
+    model: str = "phi3",
+    temperature: float = 0.0,
+    timeout: int = 120,
+    session=None,
+    keep_alive: Optional[Union[str, int]] = None,
+) -> str:
+    """
+    Async ollama_generate (aiohttp). Pass a shared `aiohttp.ClientSession` when making
+    many calls; otherwise a short-lived session is created for this request.
+    """
+    try:
+        import aiohttp
+    except ImportError as e:
+        raise RuntimeError("Async API requires `aiohttp` (pip install aiohttp).") from e
+
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": False,
+        "keep_alive": keep_alive if keep_alive is not None else keep_alive_setting(),
+        "options": {"temperature": temperature},
+    }
+    own_session = session is None
+    if own_session:
+        session = aiohttp.ClientSession()
+    try:
+        async with session.post(OLLAMA_URL, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)) as r:
+            r.raise_for_status()
+            data = await r.json()
+            _record_response(data)
+            return data.get("response", "")
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        # Ollama not running / not installed / blocked
+        return ""
+    finally:
+        if own_session:
+            await session.close()
+
+async def ollama_json_async(
+    prompt: str,
+    model: str = "phi3",
+    temperature: float = 0.0,
+    session=None,
+) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Async ollama_json. Returns (json_or_none, raw_text)."""
+    raw = await ollama_generate_async(prompt, model=model, temperature=temperature, session=session)
+    return _extract_json(raw), raw
+
+class RequestBatcher:
+    """
+    Sujungia lygiagrečius LLM užklausimus į vieną kvietimą.
+    Vienas dispečerio thread'as siunčia batch'us iš eilės: kol vyksta kvietimas,
+    nauji užklausimai kaupiasi, todėl batch'o dydis auga kartu su apkrova.
+    - single(item) -> answer: įprastas vieno dokumento kvietimas (batch'as iš 1 ir fallback)
+    - build_prompt(items) -> prompt: kelių dokumentų prompt'as
+    - split(obj, n) -> [answer | None] * n: išskaido JSON atsakymą; None -> single(item)
+    - max_batch / max_chars: batch'o ribos (dokumentų skaičius / bendras tekstų ilgis)
+    - max_wait: kiek sekundžių laukti kitų užklausimų prieš siunčiant
+    close() sustabdo dispečerio thread'ą (likę užklausimai dar išsiunčiami).
+    """
+
+    def __init__(
+        self,
+        single: Callable[[str], Any],
+        build_prompt: Callable[[List[str]], str],
+        split: Callable[[Optional[Dict[str, Any]], int], List[Any]],
+        model: str = "phi3",
+        max_batch: int = 8,
+        max_chars: int = 12000,
+        max_wait: float = 0.05,
+        temperature: float = 0.0,
+    ):
+        self.single = single
+        self.build_prompt = build_prompt
+        self.split = split
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.max_chars = max_chars
+        self.max_wait = max_wait
+        self.temperature = temperature
+        self._queue: List[Tuple[str, Future]] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def submit(self, item: str) -> Future:
+        fut: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("RequestBatcher is closed")
+            self._queue.append((item, fut))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="llm-batcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return fut
+
+    def __call__(self, item: str) -> Any:
+        return self.submit(item).result()
+
+    def close(self, timeout: Optional[float] = None):
+        with self._cond:
+            self._closed = True
+            thread = self._thread
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+
+    def _take_batch(self) -> Optional[List[Tuple[str, Future]]]:
+        with self._cond:
+            while not self._queue:
+                if self._closed:
+                    return None
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.max_batch and not self._closed:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+            batch, chars = [], 0
+            for item, fut in self._queue:
+                if batch and (len(batch) >= self.max_batch or chars + len(item) > self.max_chars):
+                    break
+                batch.append((item, fut))
+                chars += len(item)
+            del self._queue[:len(batch)]
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            try:
+                answers = self._run(batch)
+            except BaseException as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), answer in zip(batch, answers):
+                fut.set_result(answer)
+
+    def _run(self, batch: List[Tuple[str, Future]]) -> List[Any]:
+        items = [item for item, _ in batch]
+        with _STATS_LOCK:
+            _STATS["batches"] += 1
+            _STATS["batched_requests"] += len(items)
+            _STATS["max_batch"] = max(_STATS["max_batch"], len(items))
+        if len(items) == 1:
+            return [self.single(items[0])]
+
+        obj, _ = ollama_json(self.build_prompt(items), model=self.model, temperature=self.temperature)
+        answers = self.split(obj, len(items))
+        missing = [i for i, a in enumerate(answers) if a is None]
+        if missing:
+            # modelis praleido / sugadino kai kuriuos atsakymus – tik juos klausiame atskirai
+            with _STATS_LOCK:
+                _STATS["batch_fallbacks"] += len(missing)
+            for i in missing:
+                answers[i] = self.single(items[i])
+        return answers
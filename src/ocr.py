@@ -1,47 +1,260 @@
 from __future__ import annotations
 
-from typing import Dict, Any, List
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Optional
 import cv2
 import easyocr
 
-# Reader sukūrimas užtrunka, todėl laikom globaliai
+from .boxes import concat_boxes, make_boxes
+from .pages import DEFAULT_PDF_DPI, iter_pages
+from .utils import atomic_output
+
+OCR_BACKENDS = ("torch", "onnx")
+# keičiama, kai keičiasi eksportas: seni (pvz. fiksuoto pločio) cache failai nebenaudojami
+_ONNX_EXPORT_VERSION = 2
+# INT8 tik CRNN LSTM / Linear (MatMul) sluoksniams, kaip EasyOCR torch kvantizacija.
+# Conv -> ConvInteger CPU'je lėtesnis už FP32 (CRAFT ~8x, CRNN ~6x), todėl nekvantizuojama.
+_ONNX_QUANTIZE_OPS = ["MatMul", "LSTM"]
+
+# Reader sukūrimas užtrunka, todėl laikom globaliai (po vieną kiekvienai konfigūracijai)
 # Galima įdėti 'lt' jei reikia: ['en', 'lt']
-_READER = None
+_READERS: Dict[tuple, Any] = {}
+# keli dokumentai vienu metu (run_batch --llm-batch) neturi kurti to paties reader'io du kartus
+_READERS_LOCK = threading.Lock()
 
-def _get_reader(langs: List[str]):
-    global _READER
-    # Jei nori kelių kalbų (pvz en+lt), geriau inicijuoti su abiem iš karto.
-    # Paprastumo dėlei: jei jau sukurtas, pernaudojam.
-    if _READER is None:
-        _READER = easyocr.Reader(langs, gpu=False)  # gpu=False kad veiktų visur
-    return _READER
 
-def ocr_image(image_path: str, lang: str = "en") -> Dict[str, Any]:
+class _OnnxModule:
     """
-    EasyOCR OCR:
-    - text: sujungtas tekstas
-    - boxes: word/line box'ai (x,y,w,h,text,conf)
-    lang: 'en' arba 'en+lt' (mes suparsinsim)
+    Minimalus torch.nn.Module pakaitalas, kurį EasyOCR gali kviesti vietoje
+    CRAFT detektoriaus ar CRNN atpažintuvo. Įėjimai (torch tensoriai) paverčiami
+    numpy masyvais, paleidžiami per ONNX Runtime, o išėjimai grąžinami kaip
+    torch tensoriai, todėl `readtext` kodas veikia nepakeistas. FP32 išėjimai nuo
+    torch skiriasi tik skaitine paklaida (~1e-7), INT8 – daugiau (žr. README).
     """
-    img = cv2.imread(image_path)
-    if img is None:
-        raise ValueError(f"Could not read image: {image_path}")
 
+    def __init__(self, session, n_inputs: int):
+        self.session = session
+        self.input_names = [i.name for i in session.get_inputs()][:n_inputs]
+
+    def eval(self):
+        return self
+
+    def __call__(self, *args):
+        import torch
+
+        feeds = {
+            name: arg.detach().cpu().numpy()
+            for name, arg in zip(self.input_names, args)
+        }
+        outputs = [torch.from_numpy(o) for o in self.session.run(None, feeds)]
+        return outputs[0] if len(outputs) == 1 else tuple(outputs)
+
+
+def _onnx_dir(reader) -> str:
+    base = getattr(reader, "model_storage_directory", None) or os.path.expanduser("~/.EasyOCR/model")
+    path = os.path.join(base, "onnx")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _onnx_export(model, args, path: str, **kwargs):
+    """
+    torch.onnx.export senuoju (TorchScript) eksporteriu: tik jis laikosi dynamic_axes ir
+    opset 12. Naujesnio torch numatytasis dynamo eksporteris CRNN plotį užfiksuoja pagal
+    dummy įėjimą, ir kito pločio eilutės ONNX Runtime'e nepavyksta (Reshape klaida).
+    """
+    import inspect
+
+    import torch
+
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+    torch.onnx.export(model, args, path, **kwargs)
+
+
+def _crnn_for_export(recognizer):
+    """
+    CRNN su tais pačiais svoriais eksportui: AdaptiveAvgPool2d((None, 1)) (vidurkis per
+    aukštį) pakeičiamas mean(), nes ONNX eksporteris adaptyvaus pool'o su dinaminiu
+    pločiu nepalaiko. Likę sluoksniai – reader.recognizer submoduliai (vgg_model / model).
+    """
+    import torch
+
+    class _Crnn(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, image, text):
+            m = self.model
+            feature = m.FeatureExtraction(image).permute(0, 3, 1, 2)  # (N, W, C, H)
+            feature = feature.mean(dim=3)
+            return m.Prediction(m.SequenceModeling(feature).contiguous())
+
+    return _Crnn(recognizer).eval()
+
+
+def _export_onnx(reader, langs: List[str], quantize: bool) -> Dict[str, str]:
+    """Eksportuoja CRAFT ir CRNN į ONNX (vieną kartą, vėliau naudojamas cache)."""
+    import torch
+
+    out_dir = _onnx_dir(reader)
+    rec_name = "-".join(sorted(langs))
+    paths = {
+        "detector": os.path.join(out_dir, f"craft-v{_ONNX_EXPORT_VERSION}.onnx"),
+        "recognizer": os.path.join(out_dir, f"crnn-{rec_name}-v{_ONNX_EXPORT_VERSION}.onnx"),
+    }
+
+    # Keli workeriai gali eksportuoti vienu metu: rašoma į laikiną failą ir pervadinama,
+    # todėl os.path.exists niekada nemato pusiau įrašyto modelio.
+    if not os.path.exists(paths["detector"]):
+        # CRAFT: (N,3,H,W) -> (y, feature); H ir W dinaminiai
+        dummy = torch.randn(1, 3, 640, 640)
+        with atomic_output(paths["detector"]) as tmp:
+            _onnx_export(
+                reader.detector,
+                dummy,
+                tmp,
+                input_names=["image"],
+                output_names=["y", "feature"],
+                dynamic_axes={
+                    "image": {0: "batch", 2: "height", 3: "width"},
+                    "y": {0: "batch", 1: "out_height", 2: "out_width"},
+                    "feature": {0: "batch", 2: "out_height", 3: "out_width"},
+                },
+                opset_version=12,
+            )
+
+    if not os.path.exists(paths["recognizer"]):
+        # CRNN: (N,1,imgH,W) -> (N,T,num_class); `text` argumentas modelyje nenaudojamas
+        dummy = torch.randn(1, 1, reader.imgH, 256)
+        text = torch.zeros(1, 1, dtype=torch.long)
+        with atomic_output(paths["recognizer"]) as tmp:
+            _onnx_export(
+                _crnn_for_export(reader.recognizer),
+                (dummy, text),
+                tmp,
+                input_names=["image", "text"],
+                output_names=["preds"],
+                dynamic_axes={
+                    "image": {0: "batch", 3: "width"},
+                    "text": {0: "batch", 1: "length"},
+                    "preds": {0: "batch", 1: "steps"},
+                },
+                opset_version=12,
+            )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        src = paths["recognizer"]
+        dst = src.replace(".onnx", ".int8.onnx")
+        if not os.path.exists(dst):
+            with atomic_output(dst) as tmp:
+                quantize_dynamic(src, tmp, weight_type=QuantType.QInt8, op_types_to_quantize=_ONNX_QUANTIZE_OPS)
+        paths["recognizer"] = dst
+
+    return paths
+
+
+def _to_onnx_reader(reader, langs: List[str], quantize: bool, threads: int):
+    """Pakeičia reader'io detektorių ir atpažintuvą ONNX Runtime sesijomis."""
+    try:
+        import onnxruntime as ort
+    except ImportError as e:
+        raise RuntimeError("ONNX backend requires `onnxruntime` (pip install onnxruntime).") from e
+
+    paths = _export_onnx(reader, langs, quantize)
+
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads and threads > 0:
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+    providers = ["CPUExecutionProvider"]
+
+    reader.detector = _OnnxModule(ort.InferenceSession(paths["detector"], opts, providers=providers), 1)
+    # CRNN turi du įėjimus, bet eksportuotame grafe `text` gali būti išmestas
+    rec_session = ort.InferenceSession(paths["recognizer"], opts, providers=providers)
+    reader.recognizer = _OnnxModule(rec_session, len(rec_session.get_inputs()))
+    return reader
+
+
+def _get_reader(
+    langs: List[str],
+    backend: str = "torch",
+    quantize: bool = False,
+    threads: int = 0,
+    fp32: bool = False,
+):
+    """
+    EasyOCR CPU režime pagal nutylėjimą (quantize=True) dinamiškai kvantizuoja CRNN į INT8.
+    - torch: paliekama numatytoji INT8 kvantizacija; fp32=True – nekvantizuotas modelis (benchmark'o bazė)
+    - onnx: eksportui visada imamas FP32 modelis (torch.onnx neeksportuoja dinamiškai kvantizuotų
+      LSTM/Linear sluoksnių); INT8 daro ONNX Runtime (quantize=True)
+    """
+    if backend not in OCR_BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {backend} (expected one of {OCR_BACKENDS})")
+    fp32 = backend == "onnx" or bool(fp32)
+    key = (tuple(langs), backend, bool(quantize), int(threads or 0), fp32)
+    with _READERS_LOCK:
+        reader = _READERS.get(key)
+        if reader is None:
+            reader = easyocr.Reader(langs, gpu=False, quantize=not fp32)  # gpu=False kad veiktų visur
+            if backend == "onnx":
+                reader = _to_onnx_reader(reader, langs, quantize, threads)
+            _READERS[key] = reader
+    return reader
+
+
+def preload_reader(
+    lang: str = "en",
+    backend: str = "torch",
+    quantize: bool = False,
+    threads: int = 0,
+):
+    """
+    Užkrauna reader'į tėviniame procese prieš fork'inant workerius.
+    Vaikiniai procesai paveldi _READERS, todėl modelio svoriai dalijami
+    copy-on-write principu ir nekraunami iš naujo kiekviename workeryje.
+    """
+    import gc
+
+    reader = _get_reader(_parse_langs(lang), backend=backend, quantize=quantize, threads=threads)
+    if backend == "torch":
+        # svoriai tik skaitomi: be autograd ir be grad buferių
+        for module in (reader.detector, reader.recognizer):
+            module.eval()
+            for param in module.parameters():
+                param.requires_grad_(False)
+    # Python GC rašo į objektų antraštes; freeze() neleidžia GC liesti
+    # paveldėtų objektų ir taip "nukopijuoti" bendrų puslapių
+    gc.collect()
+    gc.freeze()
+    return reader
+
+
+def _parse_langs(lang: str) -> List[str]:
     # lang formatas: EasyOCR naudoja trumpinius, pvz: 'en', 'lt'.
     # Jei vartotojas duoda "en+lt" -> ['en','lt']
     if "+" in lang:
-        langs = [x.strip() for x in lang.split("+") if x.strip()]
-    else:
-        langs = [lang.strip()]
+        return [x.strip() for x in lang.split("+") if x.strip()]
+    return [lang.strip()]
 
-    reader = _get_reader(langs)
 
-    # detail=1 grąžina dėžutes ir confidence
-    # paragraph=False kad būtų daugiau kontrolės
-    results = reader.readtext(image_path, detail=1, paragraph=False)
+def _engine_name(backend: str, quantize: bool) -> str:
+    return "easyocr" if backend == "torch" else f"easyocr-onnx{'-int8' if quantize else ''}"
 
+
+def _parse_results(results, page: int = 0, scale: float = 1.0):
+    """
+    EasyOCR readtext rezultatai -> (eilutės, box'ai kaip BOX_DTYPE masyvas).
+    scale: jei OCR vyko ant sumažinto vaizdo, koordinatės grąžinamos originalo mastu.
+    """
     lines = []
-    boxes = []
+    rows = []
     for (bbox, text, conf) in results:
         if not text or not str(text).strip():
             continue
@@ -50,16 +263,206 @@ def ocr_image(image_path: str, lang: str = "en") -> Dict[str, Any]:
         # bbox: [[x1,y1],[x2,y2],[x3,y3],[x4,y4]]
         xs = [p[0] for p in bbox]
         ys = [p[1] for p in bbox]
-        x1, y1, x2, y2 = int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys))
-        boxes.append({
-            "x": x1,
-            "y": y1,
-            "w": x2 - x1,
-            "h": y2 - y1,
-            "text": str(text).strip(),
-            "conf": float(conf),
-        })
+        x1, y1, x2, y2 = (int(v / scale) for v in (min(xs), min(ys), max(xs), max(ys)))
+        rows.append((x1, y1, x2 - x1, y2 - y1, float(conf), page, str(text).strip()))
+    return lines, make_boxes(rows)
+
+
+def ocr_image(
+    image_path: str,
+    lang: str = "en",
+    backend: str = "torch",
+    quantize: bool = False,
+    threads: int = 0,
+    scale: float = 1.0,
+    fp32: bool = False,
+) -> Dict[str, Any]:
+    """
+    EasyOCR OCR:
+    - text: sujungtas tekstas
+    - boxes: word/line box'ai, BOX_DTYPE structured array (x,y,w,h,conf,page,text)
+    lang: 'en' arba 'en+lt' (mes suparsinsim)
+    backend: 'torch' (PyTorch, EasyOCR numatytasis dinaminis INT8) arba 'onnx' (ONNX Runtime, pasirinktinai INT8)
+    threads: ONNX Runtime intra-op gijų skaičius (0 = numatytasis)
+    scale: < 1.0 – OCR ant sumažinto vaizdo (greitesnis pirmas praėjimas, žr. recognize_boxes)
+    fp32: torch backend be EasyOCR kvantizacijos (žr. _get_reader)
+    """
+    img = cv2.imread(image_path)
+    if img is None:
+        raise ValueError(f"Could not read image: {image_path}")
+
+    reader = _get_reader(_parse_langs(lang), backend=backend, quantize=quantize, threads=threads, fp32=fp32)
+
+    # detail=1 grąžina dėžutes ir confidence
+    # paragraph=False kad būtų daugiau kontrolės
+    if scale < 1.0:
+        small = _downscale(img, scale)
+        results = reader.readtext(cv2.cvtColor(small, cv2.COLOR_BGR2RGB), detail=1, paragraph=False)
+    else:
+        results = reader.readtext(image_path, detail=1, paragraph=False)
+    lines, boxes = _parse_results(results, scale=scale)
 
     full_text = "\n".join(lines)
 
-    return {"engine": "easyocr", "text": full_text, "boxes": boxes}
\ No newline at end of file
+    engine = "easyocr-fp32" if fp32 and backend == "torch" else _engine_name(backend, quantize)
+    return {"engine": engine, "text": full_text, "boxes": boxes, "scale": scale}
+
+
+def _downscale(img, scale: float):
+    h, w = img.shape[:2]
+    return cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def ocr_document(
+    path: str,
+    lang: str = "en",
+    backend: str = "torch",
+    quantize: bool = False,
+    threads: int = 0,
+    page_workers: int = 2,
+    dpi: int = DEFAULT_PDF_DPI,
+    max_pages: int = 0,
+    scale: float = 1.0,
+) -> Dict[str, Any]:
+    """
+    Daugiapuslapis OCR (PDF / multi-frame TIFF):
+    - puslapiai rasterizuojami po vieną (iter_pages) ir OCR'inami lygiagrečiai
+      `page_workers` gijose; vienu metu atmintyje ne daugiau kaip page_workers*2 puslapių
+    - boxes `page` laukas nurodo puslapį
+    - pages: [{"page": i, "text": ...}] – naudojama klasifikacijai / ištraukimui
+    Grąžina tą pačią struktūrą kaip ocr_image (+ pages).
+    """
+    reader = _get_reader(_parse_langs(lang), backend=backend, quantize=quantize, threads=threads)
+
+    def run_page(page: int, bgr):
+        # EasyOCR failo keliui naudoja RGB, todėl ir masyvą paduodam RGB
+        if scale < 1.0:
+            bgr = _downscale(bgr, scale)
+        rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        results = reader.readtext(rgb, detail=1, paragraph=False)
+        return page, _parse_results(results, page=page, scale=scale)
+
+    per_page: Dict[int, tuple] = {}
+    window = max(1, page_workers) * 2
+    with ThreadPoolExecutor(max_workers=max(1, page_workers), thread_name_prefix="ocr-page") as pool:
+        pending = set()
+        for page, bgr in iter_pages(path, dpi=dpi, max_pages=max_pages):
+            pending.add(pool.submit(run_page, page, bgr))
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    page_idx, parsed = fut.result()
+                    per_page[page_idx] = parsed
+        for fut in pending:
+            page_idx, parsed = fut.result()
+            per_page[page_idx] = parsed
+
+    pages = []
+    page_boxes = []
+    for page_idx in sorted(per_page):
+        lines, pb = per_page[page_idx]
+        pages.append({"page": page_idx, "text": "\n".join(lines)})
+        page_boxes.append(pb)
+    boxes = concat_boxes(page_boxes)
+
+    full_text = "\n".join(p["text"] for p in pages)
+
+    return {"engine": _engine_name(backend, quantize), "text": full_text, "boxes": boxes, "pages": pages,
+            "scale": scale, "dpi": dpi}
+
+
+def _recognize_rects(reader, grey, rects: List[tuple], batch_size: int) -> Dict[tuple, tuple]:
+    """
+    Visi puslapio stačiakampiai (x1, y1, x2, y2) atpažįstami vienu CRNN batch'u.
+    reader.recognize() CPU režime kiekvieną box'ą leidžia atskirai, todėl iškarpos
+    ir get_text kviečiami tiesiogiai (kaip recognize() GPU šakoje). get_image_list
+    rezultatus surūšiuoja pagal y, tad grąžinama {stačiakampis: (text, conf)}.
+    """
+    from easyocr.recognition import get_text
+    from easyocr.utils import get_image_list
+
+    horizontal_list = [[x1, x2, y1, y2] for x1, y1, x2, y2 in rects]
+    image_list, max_width = get_image_list(horizontal_list, [], grey, model_height=reader.imgH)
+    if not image_list:
+        return {}
+    ignore_char = "".join(set(reader.character) - set(reader.lang_char))
+    # tie patys nustatymai kaip recognize() numatytieji (greedy dekoderis, kontrasto pakartojimas)
+    res = get_text(reader.character, reader.imgH, int(max_width), reader.recognizer, reader.converter,
+                   image_list, ignore_char=ignore_char, decoder="greedy", beamWidth=5, batch_size=batch_size,
+                   contrast_ths=0.1, adjust_contrast=0.5, filter_ths=0.003, workers=0, device=reader.device)
+    out = {}
+    for coords, text, conf in res:
+        (x1, y1), _, (x2, y2), _ = coords
+        out[(int(x1), int(y1), int(x2), int(y2))] = (text, conf)
+    return out
+
+
+def recognize_boxes(
+    path: str,
+    ocr: Dict[str, Any],
+    indices,
+    lang: str = "en",
+    backend: str = "torch",
+    quantize: bool = False,
+    threads: int = 0,
+    dpi: int = DEFAULT_PDF_DPI,
+    pad: int = 4,
+    batch_size: int = 32,
+) -> int:
+    """
+    Antras praėjimas: pasirinktus box'us iš naujo atpažįsta iš pilnos rezoliucijos
+    iškarpos (tik recognizer, be detektoriaus; vieno puslapio box'ai – batch'ais po
+    batch_size). ocr["boxes"] atnaujinamas vietoje, kai naujas confidence didesnis;
+    ocr["text"] / ocr["pages"] perrenkami. Grąžina pakeistų box'ų skaičių.
+    """
+    boxes = ocr["boxes"]
+    indices = [int(i) for i in indices]
+    if not indices:
+        return 0
+    reader = _get_reader(_parse_langs(lang), backend=backend, quantize=quantize, threads=threads)
+
+    by_page: Dict[int, List[int]] = {}
+    for i in indices:
+        by_page.setdefault(int(boxes["page"][i]), []).append(i)
+
+    changed = 0
+    for page_idx, img in iter_pages(path, dpi=dpi):
+        todo = by_page.pop(page_idx, None)
+        if not todo:
+            continue
+        grey = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        h, w = grey.shape[:2]
+        rects: Dict[tuple, List[int]] = {}
+        for i in todo:
+            x1 = max(0, int(boxes["x"][i]) - pad)
+            y1 = max(0, int(boxes["y"][i]) - pad)
+            x2 = min(w, int(boxes["x"][i] + boxes["w"][i]) + pad)
+            y2 = min(h, int(boxes["y"][i] + boxes["h"][i]) + pad)
+            if x2 > x1 and y2 > y1:
+                rects.setdefault((x1, y1, x2, y2), []).append(i)
+        if rects:
+            found = _recognize_rects(reader, grey, list(rects), batch_size)
+            for rect, (text, conf) in found.items():
+                text = str(text).strip()
+                for i in rects.get(rect, ()):
+                    if text and float(conf) > float(boxes["conf"][i]):
+                        if text != boxes["text"][i]:
+                            changed += 1
+                        boxes["text"][i] = text
+                        boxes["conf"][i] = float(conf)
+        if not by_page:
+            break  # later pages are not rasterized at all
+
+    _rebuild_text(ocr)
+    return changed
+
+
+def _rebuild_text(ocr: Dict[str, Any]):
+    """Tekstas = box'ų tekstai ta pačia tvarka, kaip pirmame praėjime."""
+    boxes = ocr["boxes"]
+    if ocr.get("pages"):
+        for p in ocr["pages"]:
+            p["text"] = "\n".join(str(t) for t in boxes["text"][boxes["page"] == p["page"]])
+        ocr["text"] = "\n".join(p["text"] for p in ocr["pages"])
+    else:
+        ocr["text"] = "\n".join(str(t) for t in boxes["text"])
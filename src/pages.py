@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import os
+from typing import Iterator, Optional, Tuple
+import cv2
+import numpy as np
+
+# Daugiapuslapiai dokumentai: PDF ir multi-frame TIFF.
+# Puslapiai rasterizuojami po vieną (generatorius), todėl visas dokumentas
+# niekada nelaikomas atmintyje.
+PDF_EXTS = {".pdf"}
+MULTIPAGE_EXTS = PDF_EXTS | {".tif", ".tiff"}
+DEFAULT_PDF_DPI = 200
+
+
+def is_multipage(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in MULTIPAGE_EXTS
+
+
+def _iter_pdf(path: str, dpi: int) -> Iterator[np.ndarray]:
+    # pypdfium2 (Apache/BSD) – pirmenybė; PyMuPDF kaip alternatyva
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        pdfium = None
+
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(path)
+        try:
+            for i in range(len(pdf)):
+                page = pdf[i]
+                # pdfium pagal nutylėjimą (rev_byteorder=False) grąžina BGR(A) – tai, ko reikia OpenCV
+                bitmap = page.render(scale=dpi / 72)
+                bgr = bitmap.to_numpy()[:, :, :3].copy()
+                bitmap.close()
+                page.close()
+                yield bgr
+        finally:
+            pdf.close()
+        return
+
+    try:
+        import fitz  # PyMuPDF
+    except ImportError as e:
+        raise RuntimeError("PDF input requires `pypdfium2` or `pymupdf` (pip install pypdfium2).") from e
+
+    doc = fitz.open(path)
+    try:
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+            rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3)
+            yield cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    finally:
+        doc.close()
+
+
+def _iter_tiff(path: str) -> Iterator[np.ndarray]:
+    # PIL skaito kadrus po vieną (seek), skirtingai nei cv2.imreadmulti
+    from PIL import Image, ImageSequence
+
+    with Image.open(path) as im:
+        for frame in ImageSequence.Iterator(im):
+            rgb = np.asarray(frame.convert("RGB"))
+            yield cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+
+def iter_pages(path: str, dpi: int = DEFAULT_PDF_DPI, max_pages: int = 0) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Yields (page_index, BGR image) lazily.
+    - PDF: rasterized at `dpi`
+    - TIFF: every frame
+    - other images: a single page
+    max_pages: stop after N pages (0 = all)
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in PDF_EXTS:
+        it = _iter_pdf(path, dpi)
+    elif ext in MULTIPAGE_EXTS:
+        it = _iter_tiff(path)
+    else:
+        img = cv2.imread(path)
+        if img is None:
+            raise ValueError(f"Could not read image: {path}")
+        it = iter([img])
+
+    for i, img in enumerate(it):
+        if max_pages and i >= max_pages:
+            break
+        yield i, img
+
+
+def first_page(path: str, dpi: int = DEFAULT_PDF_DPI) -> Optional[np.ndarray]:
+    for _, img in iter_pages(path, dpi=dpi, max_pages=1):
+        return img
+    return None
@@ -1,10 +1,143 @@
 import os
 import time
-from .ocr import ocr_image
+from contextlib import nullcontext
+from typing import Any, ContextManager, Dict, List, Optional, Tuple
+from .ocr import ocr_image, ocr_document, recognize_boxes
+from .refine import (
+    DEFAULT_OCR_SCALE, DEFAULT_REFINE_CONF,
+    field_region_indices, low_conf_indices, missing_fields,
+)
+from .boxes import boxes_to_columns
 from .classifier import classify_document
-from .extractor import extract_fields
-from .utils import save_json, save_annotated_image, ensure_dirs, get_timestamp_prefix
+from .extractor import extract_fields, focus_pages
+from .pages import DEFAULT_PDF_DPI, is_multipage
+from .utils import (
+    save_json, save_annotated_image, save_annotated_pages, submit_annotation,
+    ensure_dirs, get_timestamp_prefix,
+)
 from .spinner import Spinner
+from .dedup import DedupIndex, reused_result
+
+def run_ocr(
+    image_path: str,
+    ocr_lang: str = "en",
+    ocr_backend: str = "torch",
+    onnx_quantize: bool = False,
+    ocr_threads: int = 0,
+    page_workers: int = 2,
+    pdf_dpi: int = DEFAULT_PDF_DPI,
+    scale: float = 1.0,
+) -> Dict[str, Any]:
+    """OCR a single image, or a PDF / multi-frame TIFF page by page."""
+    kwargs = dict(lang=ocr_lang, backend=ocr_backend, quantize=onnx_quantize, threads=ocr_threads, scale=scale)
+    if is_multipage(image_path):
+        return ocr_document(image_path, page_workers=page_workers, dpi=pdf_dpi, **kwargs)
+    return ocr_image(image_path, **kwargs)
+
+def classification_text(ocr: Dict[str, Any], classify_pages: int = 1) -> str:
+    """Multi-page documents are classified from the first page(s) only."""
+    pages = ocr.get("pages")
+    if not pages or classify_pages <= 0:
+        return ocr["text"]
+    return "\n".join(p["text"] for p in pages[:classify_pages])
+
+def extraction_text(ocr: Dict[str, Any], doc_type: str) -> Tuple[str, Optional[List[int]]]:
+    """Multi-page documents: only the pages _focus_text would keep. Returns (text, page indices)."""
+    pages = ocr.get("pages")
+    if not pages:
+        return ocr["text"], None
+    page_texts = [p["text"] for p in pages]
+    keep = focus_pages(page_texts, doc_type)
+    return "\n".join(page_texts[i] for i in keep), [pages[i]["page"] for i in keep]
+
+def _finalize_result(
+    data: Dict[str, Any],
+    image_path: str,
+    text: str,
+    ocr: Dict[str, Any],
+    doc_type: str,
+    conf: float,
+    method: str,
+    total_time: float,
+    ocr_time: float,
+    classify_time: float,
+    extract_time: float,
+    save_boxes: bool = False,
+) -> Dict[str, Any]:
+    """
+    Attach OCR text and timing/classification meta to the extraction result.
+    save_boxes: also store OCR boxes in compact columnar form (`ocr_boxes`).
+    """
+    data["ocr_text"] = text
+    if save_boxes and ocr.get("boxes") is not None:
+        data["ocr_boxes"] = boxes_to_columns(ocr["boxes"])
+    # enrich
+    data.setdefault("document_type", doc_type)
+    data.setdefault("meta", {})
+
+    if ocr.get("pages"):
+        data["meta"]["pages"] = len(ocr["pages"])
+    data["meta"].update({
+        "source_image": image_path,
+        "classification_confidence": conf,
+        "classification_method": method,
+        "ocr_engine": ocr.get("engine", "easyocr"),
+        "processing_time_seconds": round(total_time, 3),
+        "ocr_time_seconds": round(ocr_time, 3),
+        "classification_time_seconds": round(classify_time, 3),
+        "extraction_time_seconds": round(extract_time, 3),
+    })
+    return data
+
+def _refine_low_conf(
+    image_path: str, ocr: Dict[str, Any], ocr_scale: float, refine_conf: float, ocr_kwargs: Dict[str, Any],
+) -> Tuple[Dict[str, Any], List[int]]:
+    """Two-pass: re-recognize boxes with conf < refine_conf. Returns (second_pass meta, their indices)."""
+    low_idx = low_conf_indices(ocr["boxes"], refine_conf)
+    second_pass = {
+        "scale": ocr_scale,
+        "boxes": int(len(ocr["boxes"])),
+        "low_conf_boxes": len(low_idx),
+        "field_boxes": 0,
+        "changed_boxes": recognize_boxes(image_path, ocr, low_idx, **ocr_kwargs),
+        "fields_retried": [],
+    }
+    return second_pass, low_idx
+
+def _field_targets(
+    ocr: Dict[str, Any], data: Dict[str, Any], doc_type: str, second_pass: Dict[str, Any], low_idx: List[int],
+) -> List[int]:
+    """Boxes in the regions of key fields extraction could not fill (targeted second pass)."""
+    missing = missing_fields(data.get("fields"), doc_type)
+    targets = field_region_indices(ocr["boxes"], missing, doc_type, exclude=low_idx)
+    if targets:
+        second_pass["field_boxes"] = len(targets)
+        second_pass["fields_retried"] = missing
+    return targets
+
+def _finish_second_pass(second_pass: Dict[str, Any]):
+    reocr = second_pass["low_conf_boxes"] + second_pass["field_boxes"]
+    second_pass["hit_rate"] = round(reocr / second_pass["boxes"], 3) if second_pass["boxes"] else 0.0
+
+def save_outputs(data: Dict[str, Any], ocr: Dict[str, Any], image_path: str, outdir: str, annotate: bool) -> str:
+    """Write the result JSON (and annotated image if requested). Returns the JSON path."""
+    base = os.path.splitext(os.path.basename(image_path))[0]
+    timestamp = get_timestamp_prefix()
+    json_filename = f"{timestamp}-{base}.json"
+    json_path = save_json(data, os.path.join(outdir, "json"), json_filename)
+
+    boxes = ocr.get("boxes")
+    if annotate and boxes is not None and len(boxes):
+        # drawn and encoded in the background writer pool, off the hot path
+        if ocr.get("pages"):
+            # pages are re-rasterized at the OCR DPI so the boxes line up
+            submit_annotation(save_annotated_pages, image_path, boxes,
+                              os.path.join(outdir, "annotated_images", f"{timestamp}-{base}"),
+                              ocr.get("dpi", DEFAULT_PDF_DPI))
+        else:
+            submit_annotation(save_annotated_image, image_path, boxes,
+                              os.path.join(outdir, "annotated_images", f"{timestamp}-{base}_boxes.jpg"))
+    return json_path
 
 def process_image(
     image_path: str,
@@ -14,17 +147,84 @@ def process_image(
     ocr_lang: str = "en",
     annotate: bool = False,
     show_spinner: bool = True,
+    ocr_backend: str = "torch",
+    onnx_quantize: bool = False,
+    ocr_threads: int = 0,
+    dedup_index: Optional[DedupIndex] = None,
+    page_workers: int = 2,
+    classify_pages: int = 1,
+    pdf_dpi: int = DEFAULT_PDF_DPI,
+    save_boxes: bool = False,
+    two_pass: bool = False,
+    ocr_scale: float = DEFAULT_OCR_SCALE,
+    refine_conf: float = DEFAULT_REFINE_CONF,
+    ocr_lock: Optional[ContextManager] = None,
 ):
-    """Process a single image: OCR -> classify -> extract -> save outputs."""
+    """
+    Process a single image: OCR -> classify -> extract -> save outputs.
+    dedup_index: if given, near-duplicate scans reuse a prior result instead of running full
+    the LLM again; hash candidates are confirmed by the first OCR pass, whose text must match
+    the prior `ocr_text` (template forms hash alike). A rejected candidate keeps that OCR,
+    so it costs no more than a document without a hash match.
+    PDF / multi-frame TIFF: pages are OCR'd in parallel (page_workers), classification
+    uses the first `classify_pages` pages and extraction only the pages _focus_text keeps.
+    two_pass: OCR at `ocr_scale` first, then re-recognize from the full-resolution image only
+    boxes with conf < `refine_conf` and the regions of key fields extraction left empty.
+    ocr_lock: held around every OCR call, so documents processed concurrently in one
+    process (eval._run_threads) overlap only their LLM steps, not OCR threads.
+    """
     start_time = time.time()
     ensure_dirs(outdir)
+    ocr_guard = ocr_lock if ocr_lock is not None else nullcontext()
+
+    ocr_args = dict(
+        ocr_lang=ocr_lang,
+        ocr_backend=ocr_backend,
+        onnx_quantize=onnx_quantize,
+        ocr_threads=ocr_threads,
+        page_workers=page_workers,
+        pdf_dpi=pdf_dpi,
+    )
+    img_hash = None
+    check: Dict[str, Any] = {}
+    if dedup_index is not None:
+        img_hash = dedup_index.hash(image_path)
+        # patikros OCR = pirmas praėjimas (tuo pačiu mastu), kad atmestas kandidatas jo nekartotų
+        check_scale = ocr_scale if two_pass else 1.0
+
+        def check_text() -> str:
+            with ocr_guard:
+                check["start"] = time.time()
+                check["ocr"] = run_ocr(image_path, scale=check_scale, **ocr_args)
+            return check["ocr"]["text"]
+
+        hit = dedup_index.lookup(img_hash, check_text)
+        if hit is not None:
+            distance, prior, similarity = hit
+            data = reused_result(prior, image_path, distance, img_hash, similarity)
+            data["meta"]["processing_time_seconds"] = round(time.time() - start_time, 3)
+            save_outputs(data, {}, image_path, outdir, annotate=False)
+            if show_spinner:
+                print(f"♻️  Near-duplicate of {data['meta']['dedup_source_image']} "
+                      f"(distance {distance}, text similarity {similarity:.2f}); reused previous result")
+            return data
 
     # OCR step
     spinner = Spinner("📄 Running OCR (EasyOCR)") if show_spinner else None
     if spinner:
         spinner.start()
-    ocr_start = time.time()
-    ocr = ocr_image(image_path, lang=ocr_lang)
+    ocr_kwargs = dict(lang=ocr_lang, backend=ocr_backend, quantize=onnx_quantize, threads=ocr_threads, dpi=pdf_dpi)
+    second_pass = None
+    low_idx: List[int] = []
+    with ocr_guard:
+        if "ocr" in check:
+            ocr_start = check["start"]
+            ocr = check["ocr"]
+        else:
+            ocr_start = time.time()
+            ocr = run_ocr(image_path, scale=ocr_scale if two_pass else 1.0, **ocr_args)
+        if two_pass:
+            second_pass, low_idx = _refine_low_conf(image_path, ocr, ocr_scale, refine_conf, ocr_kwargs)
     ocr_time = time.time() - ocr_start
     text = ocr["text"]
     if spinner:
@@ -35,7 +235,7 @@ def process_image(
     if spinner:
         spinner.start()
     classify_start = time.time()
-    doc_type, conf, method = classify_document(text, model=model, use_llm=use_llm)
+    doc_type, conf, method = classify_document(classification_text(ocr, classify_pages), model=model, use_llm=use_llm)
     classify_time = time.time() - classify_start
     if spinner:
         spinner.stop(f"✓ Classified as '{doc_type}' (confidence: {conf:.2f}, {classify_time:.2f}s)")
@@ -45,46 +245,44 @@ def process_image(
     if spinner:
         spinner.start()
     extract_start = time.time()
-    data = extract_fields(text, doc_type, model=model, use_llm=use_llm)
+    extract_input, extract_pages = extraction_text(ocr, doc_type)
+    data = extract_fields(extract_input, doc_type, model=model, use_llm=use_llm)
+    if second_pass is not None:
+        # targeted second pass for the fields extraction could not fill
+        targets = _field_targets(ocr, data, doc_type, second_pass, low_idx)
+        if targets:
+            with ocr_guard:
+                changed = recognize_boxes(image_path, ocr, targets, **ocr_kwargs)
+            second_pass["changed_boxes"] += changed
+            if changed:
+                extract_input, extract_pages = extraction_text(ocr, doc_type)
+                data = extract_fields(extract_input, doc_type, model=model, use_llm=use_llm)
+        text = ocr["text"]
+        _finish_second_pass(second_pass)
     extract_time = time.time() - extract_start
     if spinner:
         spinner.stop(f"✓ Extraction complete ({extract_time:.2f}s)")
 
-    data["ocr_text"] = text
-    # enrich
-    data.setdefault("document_type", doc_type)
-    data.setdefault("meta", {})
-
     total_time = time.time() - start_time
-
-    data["meta"].update({
-        "source_image": image_path,
-        "classification_confidence": conf,
-        "classification_method": method,
-        "ocr_engine": ocr.get("engine", "easyocr"),
-        "processing_time_seconds": round(total_time, 3),
-        "ocr_time_seconds": round(ocr_time, 3),
-        "classification_time_seconds": round(classify_time, 3),
-        "extraction_time_seconds": round(extract_time, 3),
-    })
+    data = _finalize_result(
+        data, image_path, text, ocr, doc_type, conf, method,
+        total_time=total_time, ocr_time=ocr_time, classify_time=classify_time, extract_time=extract_time,
+        save_boxes=save_boxes,
+    )
+    if second_pass is not None:
+        data["meta"]["second_pass"] = second_pass
+    if extract_pages is not None:
+        data["meta"]["classification_pages"] = min(classify_pages, len(ocr["pages"]))
+        data["meta"]["extraction_pages"] = [p + 1 for p in extract_pages]
 
     # Saving step
     spinner = Spinner("💾 Saving results") if show_spinner else None
     if spinner:
         spinner.start()
 
-    base = os.path.splitext(os.path.basename(image_path))[0]
-    timestamp = get_timestamp_prefix()
-    json_filename = f"{timestamp}-{base}.json"
-    json_path = save_json(data, os.path.join(outdir, "json"), json_filename)
-
-    if annotate and ocr.get("boxes"):
-        annotated_filename = f"{timestamp}-{base}_boxes.jpg"
-        save_annotated_image(
-            image_path=image_path,
-            boxes=ocr["boxes"],
-            out_path=os.path.join(outdir, "annotated_images", annotated_filename),
-        )
+    save_outputs(data, ocr, image_path, outdir, annotate)
+    if dedup_index is not None:
+        dedup_index.add(img_hash, data)
 
     if spinner:
         spinner.stop(f"✓ Results saved")
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterable, List, Set
+import numpy as np
+
+# Dviejų praėjimų OCR: pirmas praėjimas ant sumažinto vaizdo, antras – tik ten,
+# kur reikia: žemo confidence box'ai ir regionai laukų, kurių ekstraktorius neužpildė.
+
+# doc_type -> field -> (raktų fragmentai ištrauktuose laukuose, regex "inkaro" box'ui)
+TARGET_FIELDS: Dict[str, Dict[str, tuple]] = {
+    "invoice": {
+        "total": (("total",), r"\btotal\b|amount\s+due|gross\s+worth"),
+        "invoice_number": (("invoice_number", "invoice_no", "invoice_id"), r"invoice|\bno\b|number|#"),
+        "date": (("date",), r"\bdate\b"),
+    },
+    "receipts": {
+        "total": (("total",), r"\btotal\b|\bamount\b|\bsum\b"),
+        "date": (("date",), r"\bdate\b|\d{2}[./-]\d{2}[./-]\d{2,4}"),
+    },
+}
+
+DEFAULT_OCR_SCALE = 0.5
+DEFAULT_REFINE_CONF = 0.5
+
+
+def low_conf_indices(boxes: np.ndarray, threshold: float) -> List[int]:
+    return np.flatnonzero(boxes["conf"] < threshold).tolist()
+
+
+def _filled_keys(obj: Any, prefix: str = "") -> Set[str]:
+    """Visi raktai (ir įdėtiniai, pvz. total_amounts.grand_total) su netuščia reikšme."""
+    out: Set[str] = set()
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            key = f"{prefix}{str(k).lower()}"
+            if isinstance(v, (dict, list)):
+                nested = _filled_keys(v, key + ".")
+                if nested:
+                    out.add(key)
+                out |= nested
+            elif v not in (None, "") and str(v).strip().lower() not in ("null", "none", "n/a"):
+                out.add(key)
+    elif isinstance(obj, list):
+        for v in obj:
+            out |= _filled_keys(v, prefix)
+    return out
+
+
+def missing_fields(fields: Dict[str, Any], doc_type: str) -> List[str]:
+    """Tiksliniai laukai (total, invoice_number, date), kurių ekstraktorius neužpildė."""
+    targets = TARGET_FIELDS.get(doc_type, {})
+    filled = _filled_keys(fields or {})
+    missing = []
+    for name, (fragments, _) in targets.items():
+        if not any(frag in key for key in filled for frag in fragments):
+            missing.append(name)
+    return missing
+
+
+def field_region_indices(
+    boxes: np.ndarray,
+    missing: Iterable[str],
+    doc_type: str,
+    exclude: Iterable[int] = (),
+) -> List[int]:
+    """
+    Box'ai, kuriuose tikėtina trūkstamo lauko reikšmė: "inkaro" box'as (pvz. "Total")
+    ir box'ai toje pačioje eilutėje į dešinę nuo jo (ten paprastai stovi suma / numeris).
+    """
+    targets = TARGET_FIELDS.get(doc_type, {})
+    patterns = [re.compile(targets[m][1], re.IGNORECASE) for m in missing if m in targets]
+    if not patterns or not len(boxes):
+        return []
+
+    skip = set(int(i) for i in exclude)
+    y1 = boxes["y"].astype(np.int64)
+    y2 = y1 + boxes["h"]
+    out: Set[int] = set()
+    for i, text in enumerate(boxes["text"]):
+        if not any(p.search(str(text)) for p in patterns):
+            continue
+        out.add(i)
+        # ta pati eilutė: vertikalus persidengimas >= 50% mažesnio aukščio, į dešinę
+        overlap = np.minimum(y2, y2[i]) - np.maximum(y1, y1[i])
+        min_h = np.maximum(1, np.minimum(boxes["h"], boxes["h"][i]))
+        same_row = (overlap >= 0.5 * min_h) & (boxes["x"] > boxes["x"][i]) & (boxes["page"] == boxes["page"][i])
+        out.update(np.flatnonzero(same_row).tolist())
+    return sorted(out - skip)
@@ -0,0 +1,144 @@
+"""CPU thread budget shared by main.py, batch mode and worker pools.
+
+Torch, OpenCV and the BLAS/OpenMP runtimes all default to "use every core".
+With several pipeline processes that means workers x cores threads fighting
+for the same CPUs, so the cores are split here once and every process is told
+how many intra-op threads it may use.
+
+Environment variables must be set before numpy/torch/cv2 are imported,
+therefore `set_thread_env` is called from main.py before importing `src.pipeline`.
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional
+
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+)
+
+
+def available_cores() -> List[int]:
+    """CPU ids this process may run on (respects taskset / cgroup affinity)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_threads(workers: int = 1, threads_per_worker: int = 0) -> Dict[str, Any]:
+    """
+    Split available cores across workers.
+    - threads_per_worker=0 -> cores // workers (at least 1)
+    Returns a plain dict so it can be passed to worker initializers.
+    """
+    cores = available_cores()
+    workers = max(1, int(workers or 1))
+    tpw = int(threads_per_worker or 0)
+    if tpw <= 0:
+        tpw = max(1, len(cores) // workers)
+    return {
+        "cores": cores,
+        "workers": workers,
+        "threads_per_worker": tpw,
+        "oversubscribed": workers * tpw > len(cores),
+    }
+
+
+def set_thread_env(threads: int):
+    """Set BLAS/OpenMP thread env vars. Only effective before the libraries are imported."""
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+
+
+def apply_thread_limits(threads: int):
+    """Limit already-imported runtimes (torch intra-op pool, OpenCV)."""
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # can only be set once, before any inter-op parallel work
+            pass
+    except ImportError:
+        pass
+
+    try:
+        import cv2
+
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+
+
+def pin_to_cores(slot: int, plan: Dict[str, Any]) -> Optional[List[int]]:
+    """Pin the current process to its own slice of cores (Linux only)."""
+    if not hasattr(os, "sched_setaffinity"):
+        return None
+    cores = plan["cores"]
+    tpw = plan["threads_per_worker"]
+    start = (slot * tpw) % len(cores)
+    mine = [cores[(start + i) % len(cores)] for i in range(min(tpw, len(cores)))]
+    os.sched_setaffinity(0, mine)
+    return mine
+
+
+def configure_process(plan: Dict[str, Any], slot: int = 0, pin: bool = False):
+    """Apply the plan to the current process (main process or a single worker)."""
+    set_thread_env(plan["threads_per_worker"])
+    apply_thread_limits(plan["threads_per_worker"])
+    if pin:
+        pin_to_cores(slot, plan)
+
+
+def init_worker(plan: Dict[str, Any], slot_counter=None, pin: bool = False):
+    """ProcessPoolExecutor initializer: takes the next free slot and configures threads."""
+    slot = 0
+    if slot_counter is not None:
+        with slot_counter.get_lock():
+            slot = slot_counter.value
+            slot_counter.value += 1
+    configure_process(plan, slot=slot, pin=pin)
+
+
+def memory_usage() -> Dict[str, float]:
+    """
+    Memory of the current process in MB.
+    - rss: resident pages (shared pages counted fully in every process)
+    - pss: proportional share (shared pages split between the processes using them)
+    - uss: private pages only, i.e. what the process really costs on its own
+    Uses /proc/self/smaps_rollup (Linux); elsewhere only rss is reported.
+    """
+    out = {"pid": os.getpid(), "rss": 0.0, "pss": 0.0, "uss": 0.0}
+    try:
+        fields = {}
+        with open("/proc/self/smaps_rollup", encoding="ascii") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])  # kB
+        out["rss"] = fields.get("Rss", 0) / 1024
+        out["pss"] = fields.get("Pss", 0) / 1024
+        out["uss"] = (fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024
+    except OSError:
+        try:
+            import resource
+
+            # ru_maxrss: KB on Linux, bytes on macOS; peak rather than current
+            out["rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        except ImportError:
+            pass
+    return out
+
+
+def describe(plan: Dict[str, Any]) -> str:
+    s = (f"{plan['workers']} worker(s) x {plan['threads_per_worker']} thread(s) "
+         f"on {len(plan['cores'])} core(s)")
+    if plan["oversubscribed"]:
+        s += " [oversubscribed]"
+    return s
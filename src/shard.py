@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+# Deterministinis batch'o skaidymas keliems procesams / mašinoms su bendra failų sistema.
+# Shard'as nustatomas pagal kelio (santykinio dataset_dir atžvilgiu) hash'ą, todėl
+# visos mašinos, nepriklausomai nuo prijungimo vietos, gauna tą patį padalijimą
+# ir nereikia jokios koordinacijos.
+SHARD_MANIFEST = "shard.json"
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """'i/N' -> (i, N); i is 0-based (0 <= i < N)."""
+    try:
+        index, count = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard spec: {spec!r} (expected i/N, e.g. 0/4)") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard spec: {spec!r} (need 0 <= i < N)")
+    return index, count
+
+
+def shard_of(rel_path: str, count: int) -> int:
+    key = rel_path.replace(os.sep, "/").encode("utf-8")
+    return int(hashlib.sha1(key).hexdigest()[:16], 16) % count
+
+
+def select_shard(images: List[str], dataset_dir: str, index: int, count: int) -> List[str]:
+    return [p for p in images if shard_of(os.path.relpath(p, dataset_dir), count) == index]
+
+
+def shard_dirname(index: int, count: int) -> str:
+    return f"shard-{index}-of-{count}"
+
+
+def shard_outdir(outdir: str, index: int, count: int) -> str:
+    return os.path.join(outdir, shard_dirname(index, count))
+
+
+def load_manifest(outdir: str, index: int, count: int) -> Optional[Dict[str, Any]]:
+    """Shard'o manifestas (rašomas atomiškai pabaigoje) arba None, jei shard'as dar nebaigtas."""
+    path = os.path.join(shard_outdir(outdir, index, count), SHARD_MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def missing_shards(outdir: str, count: int) -> List[int]:
+    return [i for i in range(count) if load_manifest(outdir, i, count) is None]
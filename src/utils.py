@@ -1,12 +1,24 @@
 from __future__ import annotations
 
+import atexit
 import json
 import os
-from typing import List, Dict, Any
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from multiprocessing import util as mp_util
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Any, Optional, Set, Union
 from datetime import datetime
 import cv2
+import numpy as np
+
+from .boxes import draw_boxes
+from .pages import DEFAULT_PDF_DPI, iter_pages
 
 IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+DOCUMENT_EXTS = IMAGE_EXTS | {".pdf"}
+ANNOTATION_JPEG_QUALITY = 85
 
 def get_timestamp_prefix() -> str:
     """Returns timestamp in format YYYYMMDD-HHMM for file prefixes."""
@@ -23,23 +35,100 @@ def list_images(folder: str) -> List[str]:
     for root, _, files in os.walk(folder):
         for fn in files:
             ext = os.path.splitext(fn)[1].lower()
-            if ext in IMAGE_EXTS:
+            if ext in DOCUMENT_EXTS:
                 out.append(os.path.join(root, fn))
     return sorted(out)
 
+# ---- Atomic writes ----
+# Failas rašomas į unikalų laikiną failą tame pačiame kataloge ir pervadinamas (os.replace),
+# todėl skaitytojas (pvz. merge per bendrą failų sistemą) mato arba visą failą, arba jokio.
+# Užraktų nereikia: kiekvienas rašytojas turi savo laikiną vardą.
+
+def _tmp_path(path: str) -> str:
+    return f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+@contextmanager
+def atomic_output(path: str) -> Iterator[str]:
+    """Yields a temporary path to write to; it replaces `path` only if the block succeeds."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = _tmp_path(path)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def atomic_write(path: str, data: Union[str, bytes]):
+    with atomic_output(path) as tmp:
+        if isinstance(data, bytes):
+            with open(tmp, "wb") as f:
+                f.write(data)
+        else:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+
 def save_json(data: Dict[str, Any], folder: str, filename: str) -> str:
-    os.makedirs(folder, exist_ok=True)
     path = os.path.join(folder, filename)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    atomic_write(path, json.dumps(data, ensure_ascii=False, indent=2))
     return path
 
-def save_annotated_image(image_path: str, boxes: List[Dict[str, Any]], out_path: str):
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+def save_annotated_image(image_path: str, boxes: np.ndarray, out_path: str):
     img = cv2.imread(image_path)
     if img is None:
         return
-    for b in boxes:
-        x, y, w, h = int(b["x"]), int(b["y"]), int(b["w"]), int(b["h"])
-        cv2.rectangle(img, (x, y), (x+w, y+h), (0, 255, 0), 2)
-    cv2.imwrite(out_path, img)
+    save_annotated_array(img, boxes, out_path)
+
+def save_annotated_array(img: np.ndarray, boxes: np.ndarray, out_path: str):
+    draw_boxes(img, boxes)
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, ANNOTATION_JPEG_QUALITY])
+    if ok:
+        atomic_write(out_path, buf.tobytes())
+
+def save_annotated_pages(doc_path: str, boxes: np.ndarray, out_prefix: str, dpi: int = DEFAULT_PDF_DPI):
+    """Multi-page documents: one `<out_prefix>_p<N>_boxes.jpg` per page that has boxes (dpi: as used for OCR)."""
+    for page_idx, img in iter_pages(doc_path, dpi=dpi):
+        page_boxes = boxes[boxes["page"] == page_idx]
+        if len(page_boxes):
+            save_annotated_array(img, page_boxes, f"{out_prefix}_p{page_idx + 1}_boxes.jpg")
+
+# ---- Background writer for annotated images ----
+# Anotacijos (imread + piešimas + JPEG encode) nebėra process_image kelyje:
+# jos atiduodamos mažam gijų pool'ui (cv2 atleidžia GIL), o eilė ribojama,
+# kad lėtas diskas nesukauptų neriboto kiekio užduočių atmintyje.
+
+_ANNOTATION_POOL: Optional[ThreadPoolExecutor] = None
+_ANNOTATION_SLOTS: Optional[threading.BoundedSemaphore] = None
+_ANNOTATION_FUTURES: Set[Future] = set()
+_ANNOTATION_LOCK = threading.Lock()
+
+def _annotation_done(fut: Future):
+    _ANNOTATION_SLOTS.release()
+    with _ANNOTATION_LOCK:
+        _ANNOTATION_FUTURES.discard(fut)
+    exc = fut.exception()
+    if exc is not None:
+        print(f"⚠️  Annotation failed: {exc}", file=sys.stderr)
+
+def submit_annotation(fn, *args, workers: int = 2, max_pending: int = 16) -> Future:
+    """Run an annotation writer (save_annotated_image / save_annotated_pages) in the background."""
+    global _ANNOTATION_POOL, _ANNOTATION_SLOTS
+    with _ANNOTATION_LOCK:
+        if _ANNOTATION_POOL is None:
+            _ANNOTATION_POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="annotate")
+            _ANNOTATION_SLOTS = threading.BoundedSemaphore(max_pending)
+            atexit.register(wait_annotations)
+            # worker procesai (ProcessPoolExecutor) baigiasi per os._exit, atexit ten nevykdomas
+            mp_util.Finalize(None, wait_annotations, exitpriority=10)
+    _ANNOTATION_SLOTS.acquire()
+    fut = _ANNOTATION_POOL.submit(fn, *args)
+    with _ANNOTATION_LOCK:
+        _ANNOTATION_FUTURES.add(fut)
+    fut.add_done_callback(_annotation_done)
+    return fut
+
+def wait_annotations():
+    """Block until all queued annotated images are written."""
+    with _ANNOTATION_LOCK:
+        pending = list(_ANNOTATION_FUTURES)
+    wait(pending)
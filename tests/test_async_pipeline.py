@@ -0,0 +1,37 @@
+"""asyncio API helpers that do not need a running OCR model or Ollama."""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+for _mod in ("numpy", "cv2", "easyocr", "requests"):
+    pytest.importorskip(_mod)
+
+from src.async_pipeline import StageLimits  # noqa: E402
+
+
+def test_stage_limits_reused_across_event_loops():
+    limits = StageLimits(ocr=1, llm=2, io=1)
+    peak = []
+
+    async def run():
+        active = 0
+
+        async def job():
+            nonlocal active
+            # contention makes the semaphore bind to the running loop
+            async with limits.ocr:
+                active += 1
+                peak.append(active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(job() for _ in range(4)))
+
+    asyncio.run(run())
+    # a second loop gets its own semaphores instead of "bound to a different event loop"
+    asyncio.run(run())
+    assert max(peak) == 1
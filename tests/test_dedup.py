@@ -0,0 +1,98 @@
+"""Near-duplicate detection must not merge different documents that share a template."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+from src.dedup import DEFAULT_MIN_SIMILARITY, DEFAULT_THRESHOLD, DedupIndex, hamming, text_similarity  # noqa: E402
+
+# Two invoices from the same generator: same layout, different number, seller and amounts.
+TEXT_A = (
+    "INVOICE no 12847181 Date of issue 03/14/2013 Seller Fitzpatrick and Sons 3354 Adams Lane "
+    "Client Lopez Ltd 93 Hill Road Items 1 Office chair 2,00 each 89,99 VAT 10% Total $ 197,98"
+)
+TEXT_B = (
+    "INVOICE no 89969473 Date of issue 07/02/2019 Seller Johnson-Martin 71 Rivera Court "
+    "Client Moore PLC 5 Park Street Items 1 Desk lamp 3,00 each 24,50 VAT 10% Total $ 80,85"
+)
+
+
+def _invoice(lines):
+    """A4-ish white page: heavy template graphics (header bar, table) + small variable text."""
+    img = np.full((1100, 850, 3), 255, np.uint8)
+    cv2.rectangle(img, (40, 40), (810, 140), (60, 60, 60), -1)
+    cv2.rectangle(img, (40, 420), (810, 900), (0, 0, 0), 3)
+    for y in range(480, 900, 60):
+        cv2.line(img, (40, y), (810, y), (0, 0, 0), 2)
+    cv2.rectangle(img, (500, 940), (810, 1040), (200, 200, 200), -1)
+    for i, line in enumerate(lines):
+        cv2.putText(img, line, (60, 200 + 40 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+    return img
+
+
+def _result(text):
+    return {"document_type": "invoice", "fields": {"raw": text[:20]}, "ocr_text": text, "meta": {"source_image": "x"}}
+
+
+@pytest.fixture
+def images(tmp_path):
+    a = _invoice(["INVOICE no 12847181", "Seller Fitzpatrick and Sons", "Total $ 197,98"])
+    b = _invoice(["INVOICE no 89969473", "Seller Johnson-Martin", "Total $ 80,85"])
+    paths = {"a": str(tmp_path / "a.png"), "b": str(tmp_path / "b.png"), "a_rescan": str(tmp_path / "a_rescan.jpg")}
+    cv2.imwrite(paths["a"], a)
+    cv2.imwrite(paths["b"], b)
+    # the same page scanned again: slightly smaller, lossy JPEG
+    rescan = cv2.resize(a, (int(a.shape[1] * 0.9), int(a.shape[0] * 0.9)), interpolation=cv2.INTER_AREA)
+    cv2.imwrite(paths["a_rescan"], rescan, [cv2.IMWRITE_JPEG_QUALITY, 60])
+    return paths
+
+
+def test_text_similarity():
+    assert text_similarity(TEXT_A, TEXT_A) == 1.0
+    assert text_similarity(TEXT_A, TEXT_B) < DEFAULT_MIN_SIMILARITY
+    assert text_similarity(TEXT_A, "") == 0.0
+
+
+def test_template_invoices_do_not_dedup(images):
+    index = DedupIndex(threshold=DEFAULT_THRESHOLD)
+    ha, hb = index.hash(images["a"]), index.hash(images["b"])
+    index.add(ha, _result(TEXT_A))
+
+    # the page hashes collide, so the hash alone would reuse invoice A for invoice B ...
+    assert hamming(ha, hb) <= DEFAULT_THRESHOLD
+    assert index.candidates(hb)
+    # ... but the OCR text check rejects it
+    assert index.lookup(hb, lambda: TEXT_B) is None
+
+
+def test_rescan_of_same_invoice_is_reused(images):
+    index = DedupIndex(threshold=DEFAULT_THRESHOLD)
+    index.add(index.hash(images["a"]), _result(TEXT_A))
+
+    hit = index.lookup(index.hash(images["a_rescan"]), lambda: TEXT_A)
+    assert hit is not None
+    distance, prior, similarity = hit
+    assert distance <= DEFAULT_THRESHOLD and prior["ocr_text"] == TEXT_A and similarity == 1.0
+
+
+def test_check_ocr_runs_only_for_candidates():
+    index = DedupIndex(threshold=DEFAULT_THRESHOLD)
+    calls = []
+
+    def check():
+        calls.append(1)
+        return TEXT_B
+
+    assert index.lookup(0, check) is None
+    assert calls == []  # empty index: no OCR spent on the check
+
+    index.add(0b1, _result(TEXT_A))
+    index.add(0b11, _result(TEXT_A.replace("12847181", "12847182")))
+    index.add(~0 & 0xFFFFFFFFFFFFFFFF, _result(TEXT_B))
+    assert index.lookup(0, check) is None
+    assert calls == [1]  # one OCR for all candidates; the far entry is not a candidate
@@ -0,0 +1,72 @@
+"""ONNX export of EasyOCR's CRNN / CRAFT: dynamic width and output parity with torch."""
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+ort = pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+pytest.importorskip("easyocr")
+
+from easyocr.craft import CRAFT  # noqa: E402
+from easyocr.model.vgg_model import Model  # noqa: E402
+
+from src.ocr import _OnnxModule, _export_onnx  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def exported(tmp_path_factory):
+    # the english_g2 architecture with random weights: no model download needed
+    torch.manual_seed(0)
+    reader = types.SimpleNamespace(
+        detector=CRAFT(pretrained=False).eval(),
+        recognizer=Model(1, 256, 256, 97).eval(),
+        imgH=64,
+        model_storage_directory=str(tmp_path_factory.mktemp("models")),
+    )
+    fp32 = _export_onnx(reader, ["en"], quantize=False)
+    int8 = _export_onnx(reader, ["en"], quantize=True)
+    return reader, fp32, int8
+
+
+def _module(path):
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    return _OnnxModule(session, len(session.get_inputs()))
+
+
+@pytest.mark.parametrize("width", [48, 256, 777])
+def test_crnn_dynamic_width_matches_torch(exported, width):
+    reader, fp32, int8 = exported
+    image = torch.randn(3, 1, 64, width)
+    text = torch.zeros(3, 1, dtype=torch.long)
+    with torch.no_grad():
+        ref = reader.recognizer(image, text).numpy()
+
+    out = _module(fp32["recognizer"])(image, text).numpy()
+    assert out.shape == ref.shape
+    assert np.abs(out - ref).max() < 1e-5
+
+    out8 = _module(int8["recognizer"])(image, text).numpy()
+    assert out8.shape == ref.shape
+    assert np.abs(out8 - ref).max() < 1e-2
+
+
+def test_int8_keeps_detector_fp32(exported):
+    _, fp32, int8 = exported
+    assert int8["detector"] == fp32["detector"]
+    assert int8["recognizer"] != fp32["recognizer"]
+
+
+def test_craft_dynamic_size_matches_torch(exported):
+    reader, fp32, _ = exported
+    image = torch.randn(1, 3, 320, 480)
+    with torch.no_grad():
+        y_ref, _ = reader.detector(image)
+    y, _ = _module(fp32["detector"])(image)
+    assert y.shape == y_ref.shape
+    assert np.abs(y.numpy() - y_ref.numpy()).max() < 1e-4
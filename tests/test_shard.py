@@ -0,0 +1,107 @@
+"""Deterministic sharding, the --local-shards child command lines and merging finished shards."""
+import glob
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+
+from main import local_shard_argvs  # noqa: E402
+from src.resources import plan_threads  # noqa: E402
+from src.shard import SHARD_MANIFEST, missing_shards, parse_shard, select_shard, shard_outdir  # noqa: E402
+
+IMAGES = [os.path.join("data", label, f"{label}-{i:04d}.jpg") for label in ("email", "invoice") for i in range(20)]
+
+
+def test_parse_shard():
+    assert parse_shard("0/4") == (0, 4)
+    assert parse_shard("3/4") == (3, 4)
+    for spec in ("4/4", "-1/4", "0/0", "1", "a/b"):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+
+def test_select_shard_partitions_by_relative_path():
+    shards = [select_shard(IMAGES, "data", i, 3) for i in range(3)]
+    assert sorted(p for s in shards for p in s) == sorted(IMAGES)
+    assert all(shards)
+
+    # the same split regardless of where the dataset is mounted
+    mount = os.path.join("/mnt", "nfs")
+    moved = [os.path.join(mount, p) for p in IMAGES]
+    assert select_shard(moved, os.path.join(mount, "data"), 1, 3) == [os.path.join(mount, p) for p in shards[1]]
+
+
+def test_local_shard_argvs():
+    plan = plan_threads(workers=1)
+    argvs = local_shard_argvs(
+        ["--batch", "dataset", "--local-shards", "2", "--no-llm"], 2, len(plan["cores"])
+    )
+    threads = str(max(1, len(plan["cores"]) // 2))
+    assert argvs == [
+        ["--batch", "dataset", "--no-llm", "--threads-per-worker", threads, "--shard", "0/2"],
+        ["--batch", "dataset", "--no-llm", "--threads-per-worker", threads, "--shard", "1/2"],
+    ]
+
+    # explicit --threads-per-worker is kept as is, --local-shards=N form is stripped too
+    argvs = local_shard_argvs(
+        ["--batch", "dataset", "--local-shards=3", "--workers", "2", "--threads-per-worker", "1"], 3, 8, 2, 1
+    )
+    assert argvs[2] == ["--batch", "dataset", "--workers", "2", "--threads-per-worker", "1", "--shard", "2/3"]
+    assert local_shard_argvs([], 4, 8, workers=2)[0] == ["--threads-per-worker", "1", "--shard", "0/4"]
+
+
+def _write_shard(outdir, index, count, rows, started_at):
+    pd = pytest.importorskip("pandas")
+    from src.eval import PREDICTION_COLUMNS
+
+    sdir = shard_outdir(outdir, index, count)
+    os.makedirs(os.path.join(sdir, "metrics"))
+    pd.DataFrame(rows, columns=PREDICTION_COLUMNS).to_csv(os.path.join(sdir, "metrics", "predictions.csv"), index=False)
+    manifest = {
+        "shard": index,
+        "count": count,
+        "images": len(rows),
+        "predictions": os.path.join("metrics", "predictions.csv"),
+        "started_at": started_at,
+        "finished_at": started_at + 10.0,
+        "batch_time": 10.0,
+        "workers": "1 x 1 threads",
+        "dedup": False,
+        "two_pass": False,
+        "use_llm": False,
+        "llm_batch": False,
+    }
+    with open(os.path.join(sdir, SHARD_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+
+def test_merge_shards(tmp_path):
+    for mod in ("pandas", "matplotlib", "numpy", "cv2", "easyocr", "requests"):
+        pytest.importorskip(mod)
+    from src.eval import merge_shards
+
+    outdir = str(tmp_path)
+    row = lambda name, true, pred: (name, true, pred, 0.9, "llm", 1.0, False, None)  # noqa: E731
+    _write_shard(outdir, 0, 2, [row("a.jpg", "email", "email"), row("b.jpg", "invoice", "email")], 100.0)
+    assert missing_shards(outdir, 2) == [1]
+    with pytest.raises(RuntimeError):
+        merge_shards(outdir, 2)
+
+    _write_shard(outdir, 1, 2, [row("c.jpg", "news", "news")], 105.0)
+    assert missing_shards(outdir, 2) == []
+    merge_shards(outdir, 2)
+
+    import pandas as pd
+
+    (csv,) = glob.glob(os.path.join(outdir, "metrics", "*-predictions.csv"))
+    assert sorted(pd.read_csv(csv)["image"]) == ["a.jpg", "b.jpg", "c.jpg"]
+    (summary,) = glob.glob(os.path.join(outdir, "metrics", "*-summary.txt"))
+    with open(summary, encoding="utf-8") as f:
+        text = f.read()
+    assert "Images: 3" in text and "Accuracy: 0.667" in text
+    # wall time spans from the first shard's start to the last one's finish
+    assert "Total batch time: 15.00s" in text